@@ -28,7 +28,7 @@ class AgentLogResponse(BaseModel):
     duration_ms: Optional[int]
     status: str
     error_message: Optional[str]
-    parent_log_id: Optional[int]
+    parent_log_id: Optional[str]
     sequence_order: int
     
     class Config:
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import ORJSONResponse
 from typing import Dict, Any, List
 from pydantic import BaseModel
 from app.core.agent_base import TaskPacket, AgentTool
@@ -40,7 +41,7 @@ async def list_agents():
         "agents": [
             {
                 "name": agent.name,
-                "status": agent.status.value,
+                "status": str(agent.status),
                 "type": agent.__class__.__name__
             }
             for agent in AGENTS.values()
@@ -80,7 +81,7 @@ async def get_agent_tools(agent_name: str):
     }
 
 
-@router.post("/process")
+@router.post("/process", response_model=ProcessResponse)
 async def process_with_agent(request: ProcessRequest):
     """
     Process data with a specific agent.
@@ -111,11 +112,13 @@ async def process_with_agent(request: ProcessRequest):
         # Process with agent
         response_packet = agent.handle_packet(input_packet)
         
-        return ProcessResponse(
-            packet=response_packet.to_dict(),
-            agent_name=agent.name,
-            status="success"
-        )
+        # Encode the packet dict with orjson directly instead of going
+        # through jsonable_encoder; ProcessResponse still documents the shape
+        return ORJSONResponse({
+            "packet": response_packet.to_dict(),
+            "agent_name": agent.name,
+            "status": "success"
+        })
     
     except Exception as e:
         raise HTTPException(
@@ -162,11 +165,11 @@ async def agent_to_agent_communication(
         target = AGENTS[target_agent]
         response = target.handle_packet(packet)
         
-        return {
+        return ORJSONResponse({
             "source": source_agent,
             "target": target_agent,
             "response": response.to_dict()
-        }
+        })
     
     except Exception as e:
         raise HTTPException(
@@ -192,11 +195,11 @@ async def get_agent_history(agent_name: str):
     agent = AGENTS[agent_name]
     history = agent.get_conversation_history()
     
-    return {
+    return ORJSONResponse({
         "agent": agent_name,
         "history": [packet.to_dict() for packet in history],
         "count": len(history)
-    }
+    })
 
 
 @router.delete("/{agent_name}/history")
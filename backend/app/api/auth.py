@@ -7,6 +7,7 @@ Handles passkey registration and login.
 import logging
 import os
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
@@ -137,19 +138,20 @@ def get_active_user(
 
 # Endpoints
 @router.post("/register/begin")
-def register_begin(request: RegisterBeginRequest, db: Session = Depends(get_db)):
+async def register_begin(request: RegisterBeginRequest, db: Session = Depends(get_db)):
     """
     Begin passkey registration process.
     
     Returns WebAuthn registration options.
     """
     try:
-        options = auth_service.generate_registration_options_for_user(
+        options = await auth_service.generate_registration_options_for_user(
             username=request.username,
             display_name=request.display_name,
             db=db
         )
-        return options
+        # Options are plain JSON types already; skip jsonable_encoder
+        return ORJSONResponse(options)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -158,14 +160,14 @@ def register_begin(request: RegisterBeginRequest, db: Session = Depends(get_db))
 
 
 @router.post("/register/complete", response_model=TokenResponse)
-def register_complete(request: RegisterCompleteRequest, db: Session = Depends(get_db)):
+async def register_complete(request: RegisterCompleteRequest, db: Session = Depends(get_db)):
     """
     Complete passkey registration.
     
     Creates user and returns JWT token.
     """
     try:
-        user = auth_service.verify_registration(
+        user = await auth_service.verify_registration(
             username=request.username,
             display_name=request.display_name,
             credential_data=request.credential,
@@ -194,18 +196,18 @@ def register_complete(request: RegisterCompleteRequest, db: Session = Depends(ge
 
 
 @router.post("/login/begin")
-def login_begin(request: LoginBeginRequest, db: Session = Depends(get_db)):
+async def login_begin(request: LoginBeginRequest, db: Session = Depends(get_db)):
     """
     Begin passkey login process.
     
     Returns WebAuthn authentication options.
     """
     try:
-        options = auth_service.generate_authentication_options_for_user(
+        options = await auth_service.generate_authentication_options_for_user(
             username=request.username,
             db=db
         )
-        return options
+        return ORJSONResponse(options)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -214,14 +216,14 @@ def login_begin(request: LoginBeginRequest, db: Session = Depends(get_db)):
 
 
 @router.post("/login/complete", response_model=TokenResponse)
-def login_complete(request: LoginCompleteRequest, db: Session = Depends(get_db)):
+async def login_complete(request: LoginCompleteRequest, db: Session = Depends(get_db)):
     """
     Complete passkey login.
     
     Verifies authentication and returns JWT token.
     """
     try:
-        user = auth_service.verify_authentication(
+        user = await auth_service.verify_authentication(
             username=request.username,
             credential_data=request.credential,
             db=db
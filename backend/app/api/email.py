@@ -3,12 +3,13 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime, timedelta
-import json
+import orjson
+import asyncio
 import logging
 import re
 
 from app.database import get_db
-from app.models import Email, Transaction, AgentPreference, UserCorrection, User
+from app.models import Email, Transaction, TransactionRaw, AgentPreference, UserCorrection, User
 from app.services.email_collector import get_email_collector
 from app.services.ai_engine import get_ai_engine
 from app.services.rag_service import get_rag_service
@@ -54,12 +55,12 @@ async def sync_emails(
         logger.exception(e)
         raise HTTPException(status_code=500, detail=str(e))
 
-def _process_finance_email(db: Session, ai_engine, email, email_text: str, user_id: int = None) -> dict:
+async def _process_finance_email(db: Session, ai_engine, email, email_text: str, user_id: int = None) -> dict:
     """
     Extract finance data from email and create a transaction.
     Returns the finance analysis result.
     """
-    finance_result = ai_engine.run_finance_agent(email_text[:3000], user_id=user_id, email_id=email.id)
+    finance_result = await ai_engine.run_finance_agent(email_text[:3000], user_id=user_id, email_id=email.id)
     
     if "error" in finance_result:
         return finance_result
@@ -89,7 +90,7 @@ def _process_finance_email(db: Session, ai_engine, email, email_text: str, user_
             email_subject=email.subject,
             email_from=email.sender,
             email_date=email.date,
-            raw_email_text=email_text[:500]
+            raw=TransactionRaw(body=email_text[:500])
         )
         db.add(transaction)
         logger.info(f"Created transaction: {transaction.merchant} - {transaction.amount}")
@@ -122,6 +123,7 @@ async def analyze_pending_emails(
         finance_count = 0
         results = []
         
+        batch = []
         for email in pending_emails:
             # Get email text
             text = email.body_text or ""
@@ -132,10 +134,17 @@ async def analyze_pending_emails(
             if len(text) < 10:
                 email.processing_status = "skipped"
                 continue
-                
-            # Run Email Triage Agent
-            analysis = ai_engine.run_email_agent(text[:3000], user_id=user_id, email_id=email.id)
             
+            batch.append((email, text))
+        
+        # Run Email Triage Agent on all pending emails concurrently
+        analyses = await ai_engine.run_email_agent_batch(
+            [text[:3000] for _, text in batch],
+            user_id=user_id,
+            email_ids=[email.id for email, _ in batch]
+        )
+        
+        for (email, text), analysis in zip(batch, analyses):
             if "error" in analysis:
                 logger.error(f"Error analyzing email {email.id}: {analysis['error']}")
                 results.append({"id": email.id, "status": "failed", "error": analysis['error']})
@@ -144,12 +153,12 @@ async def analyze_pending_emails(
             # If category is Finance, run Finance Agent too
             category = analysis.get("category", "").lower()
             if category == "finance":
-                finance_result = _process_finance_email(db, ai_engine, email, text, user_id=user_id)
+                finance_result = await _process_finance_email(db, ai_engine, email, text, user_id=user_id)
                 if "error" not in finance_result and not finance_result.get("skipped"):
                     analysis["finance_data"] = finance_result
                     finance_count += 1
             
-            email.ai_analysis = json.dumps(analysis)
+            email.ai_analysis = orjson.dumps(analysis).decode()
             email.processing_status = "processed"
             email.processed_by_agent = "email_triage" if category != "finance" else "email_triage+finance"
             analyzed_count += 1
@@ -193,7 +202,7 @@ async def analyze_single_email(
         if len(text) < 50 and email.body_html:
             text = re.sub('<[^<]+?>', '', email.body_html)
               
-        analysis = ai_engine.run_email_agent(text[:3000], user_id=user_id, email_id=email.id)
+        analysis = await ai_engine.run_email_agent(text[:3000], user_id=user_id, email_id=email.id)
         
         if "error" in analysis:
             raise HTTPException(status_code=500, detail=analysis["error"])
@@ -201,11 +210,11 @@ async def analyze_single_email(
         # If category is Finance, run Finance Agent too
         category = analysis.get("category", "").lower()
         if category == "finance":
-            finance_result = _process_finance_email(db, ai_engine, email, text, user_id=user_id)
+            finance_result = await _process_finance_email(db, ai_engine, email, text, user_id=user_id)
             if "error" not in finance_result and not finance_result.get("skipped"):
                 analysis["finance_data"] = finance_result
             
-        email.ai_analysis = json.dumps(analysis)
+        email.ai_analysis = orjson.dumps(analysis).decode()
         email.processing_status = "processed"
         email.processed_by_agent = "email_triage_manual" if category != "finance" else "email_triage_manual+finance"
         
@@ -249,7 +258,7 @@ async def list_emails(
         
         if email.ai_analysis:
             try:
-                data = json.loads(email.ai_analysis)
+                data = orjson.loads(email.ai_analysis)
                 category = data.get("category", "Uncategorized")
                 summary = data.get("summary", "")
                 urgency_score = data.get("urgency_score", 0)
@@ -332,7 +341,7 @@ async def get_email_detail(
     
     if email.ai_analysis:
         try:
-            data = json.loads(email.ai_analysis)
+            data = orjson.loads(email.ai_analysis)
             category = data.get("category", "Uncategorized")
             summary = data.get("summary", "")
             urgency_score = data.get("urgency_score", 0)
@@ -347,7 +356,7 @@ async def get_email_detail(
     attachments = []
     if email.attachments:
         try:
-            attachments = json.loads(email.attachments)
+            attachments = orjson.loads(email.attachments)
         except:
             pass
     
@@ -429,15 +438,17 @@ async def assign_email_to_agents(
         try:
             if agent_id == "email":
                 # Run email triage
-                analysis = ai_engine.analyze_email(email_text, db_session=db)
-                email.ai_analysis = json.dumps(analysis)
+                analysis = await ai_engine.run_email_agent(
+                    email_text, db_session=db, user_id=user_id, email_id=email.id
+                )
+                email.ai_analysis = orjson.dumps(analysis).decode()
                 email.processing_status = "processed"
                 email.processed_by_agent = "email"
                 results.append({"agent": "email", "status": "success", "data": analysis})
                 
             elif agent_id == "finance":
                 # Run finance extraction
-                result = _process_finance_email(db, ai_engine, email, email_text, user_id=user_id)
+                result = await _process_finance_email(db, ai_engine, email, email_text, user_id=user_id)
                 results.append({"agent": "finance", "status": "success", "data": result})
                 
             else:
@@ -540,7 +551,7 @@ async def correct_email_analysis(
 ):
     """
     Submit a correction to an email's AI analysis.
-    Stores the correction in both the DB and ChromaDB for RAG learning.
+    Stores the correction in both the DB and the RAG store for learning.
     """
     query = db.query(Email).filter(Email.id == email_id)
     if current_user:
@@ -556,12 +567,12 @@ async def correct_email_analysis(
     old_value = None
     if email.ai_analysis:
         try:
-            data = json.loads(email.ai_analysis)
+            data = orjson.loads(email.ai_analysis)
             old_value = str(data.get(request.field, ""))
             # Apply correction to stored analysis
             data[request.field] = request.new_value
-            email.ai_analysis = json.dumps(data)
-        except json.JSONDecodeError:
+            email.ai_analysis = orjson.dumps(data).decode()
+        except orjson.JSONDecodeError:
             pass
 
     # Save correction to DB
@@ -575,11 +586,12 @@ async def correct_email_analysis(
     db.add(correction)
     db.commit()
 
-    # Store in ChromaDB for RAG
+    # Store in RAG; embedding runs in a worker thread, not on the event loop
     email_text = email.body_text or email.subject or ""
     try:
         rag = get_rag_service()
-        rag.store_correction(
+        await asyncio.to_thread(
+            rag.store_correction,
             email_id=email_id,
             field=request.field,
             old_value=old_value or "",
@@ -587,6 +599,7 @@ async def correct_email_analysis(
             email_text=email_text,
             user_id=user_id,
         )
+        get_ai_engine().invalidate_rag_context(user_id)
     except Exception as e:
         logger.error(f"Failed to store correction in RAG: {e}")
 
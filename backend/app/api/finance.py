@@ -9,10 +9,11 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
+import orjson
 import re
 
 from app.database import get_db
-from app.models import Transaction, Email, User
+from app.models import Transaction, TransactionRaw, Email, User
 from app.services.email_collector import get_email_collector
 from app.api.auth import get_active_user
 
@@ -222,7 +223,7 @@ async def process_email_manually(
             engine = get_ai_engine()
             
             # Call the Finance Crew
-            parsed_data = engine.run_finance_agent(text_content + " " + email.subject)
+            parsed_data = await engine.run_finance_agent(text_content + " " + email.subject)
             
             # Check for errors
             if "error" in parsed_data:
@@ -242,8 +243,8 @@ async def process_email_manually(
                 email_subject=email.subject,
                 email_from=email.sender,
                 email_date=email.date or datetime.utcnow(),
-                raw_email_text=text_content,
-                ai_analysis=str(parsed_data),
+                raw=TransactionRaw(body=text_content),
+                ai_analysis=orjson.dumps(parsed_data).decode(),
                 is_processed=True
             )
             
@@ -304,7 +305,7 @@ async def parse_transaction(
             email_subject="Manual Entry",
             email_from="user@manual",
             email_date=datetime.utcnow(),
-            raw_email_text=request.text,
+            raw=TransactionRaw(body=request.text),
             ai_analysis=f"Parsed: {parsed_data['merchant']}, {parsed_data['amount']}, {parsed_data['category']}",
             is_processed=True
         )
@@ -1,8 +1,48 @@
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
 from abc import ABC, abstractmethod
+from collections import deque
 from typing import Any, Dict, List, Optional, Callable
-from datetime import datetime
-from pydantic import BaseModel, Field
-from enum import Enum
+from datetime import datetime, timedelta, timezone
+from pydantic import BaseModel, Field, PrivateAttr, field_validator, model_validator
+from enum import IntEnum
+
+try:
+    import orjson
+except ImportError:  # pydantic's own JSON encoder/decoder is used instead
+    orjson = None
+
+# Packets kept per agent; older ones are dropped as new ones arrive
+AGENT_HISTORY_MAX = int(os.getenv("AGENT_HISTORY_MAX", "1024"))
+# With the entropy gate on, packets whose data renders shorter than this
+# are not recorded
+AGENT_MIN_SIGNAL_LEN = int(os.getenv("AGENT_MIN_SIGNAL_LEN", "4"))
+
+# Recent packet fingerprints remembered per agent when dedupe is on
+AGENT_DEDUPE_WINDOW = 64
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_EPOCH_NAIVE = _EPOCH.replace(tzinfo=None)
+
+# Agent class -> encoded tool definitions
+_tools_schema_cache: Dict[type, str] = {}
+
+
+def _stable_hash(data: Any) -> int:
+    """64-bit content hash of a packet payload, independent of dict key order."""
+    try:
+        if orjson is not None:
+            raw = orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+        else:
+            raw = json.dumps(data, sort_keys=True).encode()
+    except TypeError:
+        raw = repr(data).encode()
+    return int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "little")
 
 
 class TaskPacket(BaseModel):
@@ -33,24 +73,99 @@ class TaskPacket(BaseModel):
         description="Additional context (priority, routing, conversation_id, etc.)"
     )
     
-    timestamp: datetime = Field(
-        default_factory=datetime.utcnow,
-        description="When this packet was created"
+    timestamp_ns: int = Field(
+        default_factory=time.time_ns,
+        description="When this packet was created (Unix epoch nanoseconds)"
     )
     
-    class Config:
-        json_encoders = {
-            datetime: lambda v: v.isoformat()
-        }
+    # Encoded form, reused while no field is reassigned. In-place changes to
+    # data/metadata are not tracked; reassign the field or clear it by hand.
+    _json_cache: Optional[str] = PrivateAttr(default=None)
+    
+    @field_validator("source_agent", "target_agent")
+    @classmethod
+    def _intern_agent(cls, value: Optional[str]) -> Optional[str]:
+        """Agent names repeat across packets; keep one shared copy of each."""
+        return sys.intern(value) if value is not None else None
+    
+    @model_validator(mode="before")
+    @classmethod
+    def _accept_timestamp(cls, values: Any) -> Any:
+        """Map a legacy `timestamp` (datetime, ISO string or epoch ns) to timestamp_ns."""
+        if isinstance(values, dict) and "timestamp" in values:
+            values = dict(values)
+            ts = values.pop("timestamp")
+            if isinstance(ts, str):
+                ts = datetime.fromisoformat(ts)
+            if isinstance(ts, datetime):
+                if ts.tzinfo is None:
+                    ts = ts.replace(tzinfo=timezone.utc)
+                # Exact integer arithmetic; float timestamp() truncation is
+                # off by a second before 1970
+                delta = ts - _EPOCH
+                ts = (delta.days * 86_400 + delta.seconds) * 1_000_000_000 + delta.microseconds * 1000
+            values.setdefault("timestamp_ns", ts)
+        return values
+    
+    @property
+    def timestamp(self) -> datetime:
+        """Creation time as a naive UTC datetime, built on access."""
+        return _EPOCH_NAIVE + timedelta(microseconds=self.timestamp_ns // 1000)
+    
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if name in type(self).model_fields:
+            self._json_cache = None
+    
+    def model_copy(self, *, update: Optional[Dict[str, Any]] = None, deep: bool = False) -> "TaskPacket":
+        """Copy the packet; update= bypasses __setattr__, so the copy starts uncached."""
+        copy = super().model_copy(update=update, deep=deep)
+        copy._json_cache = None
+        return copy
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert TaskPacket to dictionary."""
         return self.model_dump()
     
     def to_json(self) -> str:
-        """Serialize TaskPacket to JSON string."""
+        """Serialize TaskPacket to JSON string (cached until a field is set)."""
+        if self._json_cache is None:
+            self._json_cache = self._encode_json()
+        return self._json_cache
+    
+    def _encode_json(self) -> str:
+        if orjson is not None:
+            # Fields go straight to orjson, skipping the model_dump() copy;
+            # same output as model_dump_json()
+            try:
+                return orjson.dumps({
+                    "source_agent": self.source_agent,
+                    "target_agent": self.target_agent,
+                    "data": self.data,
+                    "metadata": self.metadata,
+                    "timestamp_ns": self.timestamp_ns,
+                }).decode()
+            except TypeError:
+                pass  # data holds something orjson can't encode
         return self.model_dump_json()
     
+    @classmethod
+    def _trusted(cls, source_agent: str, target_agent: Optional[str], data: Any,
+                 metadata: Optional[Dict[str, Any]]) -> "TaskPacket":
+        """
+        Build a packet from values an agent produced itself, skipping validation.
+        
+        Anything arriving from outside goes through the validating
+        constructor, from_dict() or from_json() instead.
+        """
+        return cls.model_construct(
+            source_agent=sys.intern(source_agent),
+            target_agent=target_agent,
+            data=data,
+            # Own copy: handle_packet writes into the response's metadata
+            metadata=dict(metadata) if metadata else {},
+        )
+    
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "TaskPacket":
         """Create TaskPacket from dictionary."""
@@ -59,6 +174,8 @@ class TaskPacket(BaseModel):
     @classmethod
     def from_json(cls, json_str: str) -> "TaskPacket":
         """Deserialize TaskPacket from JSON string."""
+        if orjson is not None:
+            return cls.from_dict(orjson.loads(json_str))
         return cls.model_validate_json(json_str)
 
 
@@ -92,14 +209,20 @@ class AgentTool(BaseModel):
     
     class Config:
         arbitrary_types_allowed = True
+        # Agents share one set of tool instances across calls
+        frozen = True
 
 
-class AgentStatus(str, Enum):
+class AgentStatus(IntEnum):
     """Agent operational status."""
-    IDLE = "idle"
-    PROCESSING = "processing"
-    ERROR = "error"
-    STOPPED = "stopped"
+    IDLE = 0
+    PROCESSING = 1
+    ERROR = 2
+    STOPPED = 3
+    
+    def __str__(self) -> str:
+        """Lowercase name ("idle"), as exposed by the API and logs."""
+        return self.name.lower()
 
 
 class BaseAgent(ABC):
@@ -115,10 +238,43 @@ class BaseAgent(ABC):
     - get_tools(): List of available tools
     """
     
-    def __init__(self):
-        """Initialize the base agent."""
+    # Subclasses that declare __slots__ get dict-free instances; those that
+    # don't still get a __dict__ as usual
+    __slots__ = ("_status", "_conversation_history", "entropy_gate", "min_signal_len",
+                 "dedupe", "_recent_hashes", "_lock")
+    
+    def __init_subclass__(cls, **kwargs):
+        """Check a class-level _TOOLS tuple once, so callers can trust get_tools()."""
+        super().__init_subclass__(**kwargs)
+        tools = cls.__dict__.get("_TOOLS")
+        if tools is not None and not (
+            isinstance(tools, tuple) and all(isinstance(t, AgentTool) for t in tools)
+        ):
+            raise TypeError(f"{cls.__name__}._TOOLS must be a tuple of AgentTool")
+    
+    def __init__(self, history_max: Optional[int] = None, entropy_gate: bool = False,
+                 min_signal_len: int = AGENT_MIN_SIGNAL_LEN, dedupe: bool = False):
+        """
+        Initialize the base agent.
+        
+        Args:
+            history_max: Packets to keep in the conversation history
+                (defaults to AGENT_HISTORY_MAX)
+            entropy_gate: Skip recording empty or trivial packets in history.
+                Off by default; production agents should turn it on.
+            min_signal_len: Shortest rendered data recorded when gated
+            dedupe: Skip recording a packet whose sender, recipient and data
+                match one of the last AGENT_DEDUPE_WINDOW recorded packets
+        """
         self._status = AgentStatus.IDLE
-        self._conversation_history: List[TaskPacket] = []
+        self._conversation_history: deque = deque(maxlen=history_max or AGENT_HISTORY_MAX)
+        self.entropy_gate = entropy_gate
+        self.min_signal_len = min_signal_len
+        self.dedupe = dedupe
+        self._recent_hashes: deque = deque(maxlen=AGENT_DEDUPE_WINDOW)
+        # Batches run on a worker thread; this keeps them and direct calls
+        # from interleaving on the agent's state
+        self._lock = threading.RLock()
     
     @property
     @abstractmethod
@@ -161,6 +317,21 @@ class BaseAgent(ABC):
         """
         pass
     
+    def tools_schema_json(self) -> str:
+        """
+        JSON list of this agent's tool definitions, for LLM handoff.
+        
+        Encoded once per agent class, so get_tools() must not vary
+        between instances.
+        """
+        cls = type(self)
+        cached = _tools_schema_cache.get(cls)
+        if cached is None:
+            tools = [tool.model_dump() for tool in self.get_tools()]
+            cached = orjson.dumps(tools).decode() if orjson is not None else json.dumps(tools)
+            _tools_schema_cache[cls] = cached
+        return cached
+    
     def initialize(self) -> None:
         """
         Optional initialization logic.
@@ -194,13 +365,28 @@ class BaseAgent(ABC):
         Returns:
             TaskPacket with this agent as source
         """
-        return TaskPacket(
+        return TaskPacket._trusted(
             source_agent=self.name,
-            target_agent=target_agent,
+            target_agent=sys.intern(target_agent) if target_agent is not None else None,
             data=data,
-            metadata=metadata or {}
+            metadata=metadata
         )
     
+    def process_batch(self, inputs: List[Any]) -> List[TaskPacket]:
+        """
+        Process several inputs at once.
+        
+        Override this method when the agent can do the work for a whole batch
+        more cheaply than input by input (one model call, one vectorized pass).
+        
+        Args:
+            inputs: Input data, one item per packet
+        
+        Returns:
+            One response TaskPacket per input, in input order
+        """
+        return [self.process(input_data) for input_data in inputs]
+    
     def handle_packet(self, packet: TaskPacket) -> TaskPacket:
         """
         Process a TaskPacket and return a response.
@@ -213,34 +399,113 @@ class BaseAgent(ABC):
         Returns:
             Response TaskPacket
         """
-        # Add to conversation history
-        self._conversation_history.append(packet)
+        with self._lock:
+            self._record(packet)
+            
+            # Update status
+            self._status = AgentStatus.PROCESSING
+            
+            try:
+                # Process the packet's data
+                response = self._address_response(packet, self.process(packet.data))
+                self._status = AgentStatus.IDLE
+                return response
+                
+            except Exception as e:
+                self._status = AgentStatus.ERROR
+                return self._error_response(packet, e)
+    
+    async def handle_packet_batch(self, packets: List[TaskPacket]) -> List[TaskPacket]:
+        """
+        Handle several packets off the event loop in a single thread hop.
         
-        # Update status
-        self._status = AgentStatus.PROCESSING
+        The inputs go through process_batch() together; if the batch fails,
+        each packet is retried on its own so one bad input only fails itself.
         
-        try:
-            # Process the packet's data
-            response = self.process(packet.data)
-            
-            # Add conversation context to metadata
-            if "conversation_id" in packet.metadata:
-                response.metadata["conversation_id"] = packet.metadata["conversation_id"]
+        Args:
+            packets: Input TaskPackets
+        
+        Returns:
+            Response TaskPackets, in input order
+        """
+        if not packets:
+            return []
+        return await asyncio.to_thread(self._handle_batch, packets)
+    
+    def _handle_batch(self, packets: List[TaskPacket]) -> List[TaskPacket]:
+        """Worker-thread body of handle_packet_batch()."""
+        with self._lock:
+            for packet in packets:
+                self._record(packet)
             
-            # Set target as the source of the incoming packet
-            if not response.target_agent:
-                response.target_agent = packet.source_agent
+            self._status = AgentStatus.PROCESSING
             
-            self._status = AgentStatus.IDLE
-            return response
+            try:
+                outputs = self.process_batch([packet.data for packet in packets])
+                responses = [self._address_response(packet, response)
+                             for packet, response in zip(packets, outputs, strict=True)]
+                self._status = AgentStatus.IDLE
+                return responses
+            except Exception:
+                # Fall through to one packet at a time
+                responses = []
             
-        except Exception as e:
-            self._status = AgentStatus.ERROR
-            return self.create_response(
-                data={"error": str(e), "type": type(e).__name__},
-                target_agent=packet.source_agent,
-                metadata={"error": True, "original_packet": packet.to_dict()}
-            )
+            for packet in packets:
+                try:
+                    responses.append(self._address_response(packet, self.process(packet.data)))
+                    self._status = AgentStatus.IDLE
+                except Exception as e:
+                    self._status = AgentStatus.ERROR
+                    responses.append(self._error_response(packet, e))
+            return responses
+    
+    def _record(self, packet: TaskPacket) -> None:
+        """Add a packet to the conversation history, unless gated or repeated."""
+        if self._should_record(packet) and not self._is_duplicate(packet):
+            self._conversation_history.append(packet)
+    
+    def _address_response(self, packet: TaskPacket, response: TaskPacket) -> TaskPacket:
+        """Carry the conversation over and reply to the packet's sender."""
+        # Add conversation context to metadata
+        if "conversation_id" in packet.metadata:
+            response.metadata["conversation_id"] = packet.metadata["conversation_id"]
+            response._json_cache = None  # Changed in place
+        
+        # Set target as the source of the incoming packet
+        if not response.target_agent:
+            response.target_agent = packet.source_agent
+        return response
+    
+    def _error_response(self, packet: TaskPacket, error: Exception) -> TaskPacket:
+        """Build the error reply for a packet whose processing raised."""
+        return self.create_response(
+            data={"error": str(error), "type": type(error).__name__},
+            target_agent=packet.source_agent,
+            metadata={"error": True, "original_packet": packet.to_dict()}
+        )
+    
+    def _should_record(self, packet: TaskPacket) -> bool:
+        """Whether a packet carries enough signal to keep in history."""
+        if not self.entropy_gate:
+            return True
+        data = packet.data
+        if data is None or (isinstance(data, (str, list, dict)) and not data):
+            return False
+        return len(str(data)) >= self.min_signal_len
+    
+    def _is_duplicate(self, packet: TaskPacket) -> bool:
+        """
+        Whether a packet repeats a recently recorded one.
+        
+        Remembers the packet's fingerprint when it is new.
+        """
+        if not self.dedupe:
+            return False
+        h = hash((packet.source_agent, packet.target_agent, _stable_hash(packet.data)))
+        if h in self._recent_hashes:
+            return True
+        self._recent_hashes.append(h)
+        return False
     
     def get_conversation_history(self) -> List[TaskPacket]:
         """
@@ -249,12 +514,15 @@ class BaseAgent(ABC):
         Returns:
             List of TaskPackets in chronological order
         """
-        return self._conversation_history.copy()
+        with self._lock:
+            return list(self._conversation_history)
     
     def clear_history(self) -> None:
         """Clear the conversation history."""
-        self._conversation_history.clear()
+        with self._lock:
+            self._conversation_history.clear()
+            self._recent_hashes.clear()
     
     def __repr__(self) -> str:
         """String representation of the agent."""
-        return f"{self.__class__.__name__}(name='{self.name}', status='{self.status.value}')"
+        return f"{self.__class__.__name__}(name='{self.name}', status='{self.status}')"
@@ -6,39 +6,203 @@ Supports both SQLite (local dev) and PostgreSQL (Docker/production).
 """
 
 import os
-from sqlalchemy import create_engine
+import logging
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker, Session
 from app.models import Base
 
+logger = logging.getLogger(__name__)
+
 # Read DATABASE_URL from environment, fallback to SQLite for local dev
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./envoy_ai.db")
 
 # Engine configuration varies by database type
 connect_args = {}
+pool_args = {}
 if DATABASE_URL.startswith("sqlite"):
     connect_args["check_same_thread"] = False  # Required for SQLite
+else:
+    # Sized for concurrent request handlers plus the background writers,
+    # so a session is a pool checkout rather than a new connection
+    pool_args["pool_size"] = int(os.getenv("DB_POOL_SIZE", "16"))
+    pool_args["max_overflow"] = int(os.getenv("DB_MAX_OVERFLOW", "32"))
 
 engine = create_engine(
     DATABASE_URL,
     connect_args=connect_args,
     pool_pre_ping=True,  # Verify connections are alive before using
+    **pool_args,
 )
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# pgvector HNSW index build: graph degree and build-time candidate list size
+HNSW_M = int(os.getenv("HNSW_M", "24"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "128"))
+# Build memory and parallel workers; unset keeps the server's settings
+HNSW_MAINTENANCE_WORK_MEM = os.getenv("HNSW_MAINTENANCE_WORK_MEM")
+HNSW_MAINTENANCE_WORKERS = os.getenv("HNSW_MAINTENANCE_WORKERS")
+# Users with large mailboxes get their own partial HNSW index, so their
+# user-filtered queries walk a graph of their emails only (comma-separated ids)
+HNSW_USER_INDEXES = [
+    int(u) for u in os.getenv("HNSW_USER_INDEXES", "").split(",") if u.strip()
+]
+
 
 def init_db():
     """Initialize database tables. Enables pgvector extension for PostgreSQL."""
     if not DATABASE_URL.startswith("sqlite"):
         try:
-            from sqlalchemy import text as sa_text
             with engine.connect() as conn:
-                conn.execute(sa_text("CREATE EXTENSION IF NOT EXISTS vector"))
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
                 conn.commit()
         except Exception:
             pass  # Extension may already exist or not be available
     Base.metadata.create_all(bind=engine)
+    _migrate_transaction_raw()
+    _migrate_agent_log_parent()
+    _migrate_credential_id_bytes()
+    _migrate_embeddings_halfvec()
+    _create_missing_indexes()
+    _create_hnsw_indexes()
+
+
+def _migrate_transaction_raw():
+    """Move legacy transactions.raw_email_text into the transaction_raw table."""
+    columns = {col["name"] for col in inspect(engine).get_columns("transactions")}
+    if "raw_email_text" not in columns:
+        return
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO transaction_raw (transaction_id, body) "
+            "SELECT id, raw_email_text FROM transactions WHERE raw_email_text IS NOT NULL"
+        ))
+        conn.execute(text("ALTER TABLE transactions DROP COLUMN raw_email_text"))
+
+
+def _migrate_agent_log_parent():
+    """agent_logs.parent_log_id now holds the parent's run_id instead of its integer id."""
+    if DATABASE_URL.startswith("sqlite"):
+        return  # SQLite stores text in an INTEGER column as-is
+    columns = {col["name"]: col for col in inspect(engine).get_columns("agent_logs")}
+    parent = columns.get("parent_log_id")
+    if parent is None or parent["type"].python_type is not int:
+        return
+    with engine.begin() as conn:
+        conn.execute(text(
+            "ALTER TABLE agent_logs ALTER COLUMN parent_log_id TYPE VARCHAR(36) "
+            "USING parent_log_id::text"
+        ))
+        # Point existing handoffs at the parent's run_id, as new rows do
+        conn.execute(text(
+            "UPDATE agent_logs AS child SET parent_log_id = parent.run_id "
+            "FROM agent_logs AS parent WHERE child.parent_log_id = parent.id::text"
+        ))
+
+
+def _migrate_credential_id_bytes():
+    """credentials.credential_id used to be hex text; store the raw bytes instead."""
+    columns = {col["name"]: col for col in inspect(engine).get_columns("credentials")}
+    credential_id = columns.get("credential_id")
+    if credential_id is None or credential_id["type"].python_type is not str:
+        return
+    with engine.begin() as conn:
+        if DATABASE_URL.startswith("sqlite"):
+            # Column affinity doesn't matter to SQLite; rewrite the values only
+            rows = conn.execute(text(
+                "SELECT id, credential_id FROM credentials WHERE typeof(credential_id) = 'text'"
+            )).fetchall()
+            for row_id, hex_id in rows:
+                conn.execute(
+                    text("UPDATE credentials SET credential_id = :cid WHERE id = :id"),
+                    {"cid": bytes.fromhex(hex_id), "id": row_id},
+                )
+        else:
+            conn.execute(text(
+                "ALTER TABLE credentials ALTER COLUMN credential_id TYPE BYTEA "
+                "USING decode(credential_id, 'hex')"
+            ))
+
+
+def _migrate_embeddings_halfvec():
+    """Embedding columns moved from vector (FP32) to halfvec (FP16)."""
+    if DATABASE_URL.startswith("sqlite"):
+        return
+    tables = {
+        "email_embeddings": "idx_email_emb_hnsw",
+        "correction_embeddings": "idx_correction_emb_hnsw",
+    }
+    with engine.begin() as conn:
+        rows = conn.execute(text(
+            "SELECT table_name FROM information_schema.columns "
+            "WHERE column_name = 'embedding' AND udt_name = 'vector' "
+            "AND table_name IN ('email_embeddings', 'correction_embeddings')"
+        )).fetchall()
+        for (table,) in rows:
+            # The HNSW index uses vector_cosine_ops; _create_hnsw_indexes
+            # rebuilds it for halfvec right after
+            conn.execute(text(f"DROP INDEX IF EXISTS {tables[table]}"))
+            conn.execute(text(
+                f"ALTER TABLE {table} ALTER COLUMN embedding TYPE halfvec(384) "
+                f"USING embedding::halfvec(384)"
+            ))
+
+
+def _create_missing_indexes():
+    """create_all skips indexes on tables that already exist; add them here."""
+    from app.models import Credential
+
+    for index in Credential.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+
+def _create_hnsw_indexes():
+    """
+    Build missing HNSW cosine indexes on the embedding tables.
+    
+    CREATE INDEX CONCURRENTLY keeps the tables writable during the build. It
+    can't run inside a transaction, so the connection is in autocommit.
+    """
+    if DATABASE_URL.startswith("sqlite"):
+        return
+    indexes = [
+        ("idx_email_emb_hnsw", "email_embeddings", ""),
+        ("idx_correction_emb_hnsw", "correction_embeddings", ""),
+    ] + [
+        (f"idx_email_emb_hnsw_u{user_id}", "email_embeddings", f" WHERE user_id = {user_id}")
+        for user_id in HNSW_USER_INDEXES
+    ]
+    try:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            try:
+                if HNSW_MAINTENANCE_WORK_MEM:
+                    conn.execute(text("SELECT set_config('maintenance_work_mem', :v, false)"),
+                                 {"v": HNSW_MAINTENANCE_WORK_MEM})
+                if HNSW_MAINTENANCE_WORKERS:
+                    conn.execute(text("SELECT set_config('max_parallel_maintenance_workers', :v, false)"),
+                                 {"v": HNSW_MAINTENANCE_WORKERS})
+                for index, table, where in indexes:
+                    # An interrupted concurrent build leaves an INVALID index
+                    # that IF NOT EXISTS would otherwise skip forever
+                    invalid = conn.execute(text(
+                        "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                        "WHERE c.relname = :name AND NOT i.indisvalid"
+                    ), {"name": index}).first()
+                    if invalid:
+                        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index}"))
+                    conn.execute(text(
+                        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index} ON {table} "
+                        f"USING hnsw (embedding halfvec_cosine_ops) "
+                        f"WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION}){where}"
+                    ))
+            finally:
+                # Session settings would otherwise follow the pooled connection
+                conn.execute(text("RESET maintenance_work_mem"))
+                conn.execute(text("RESET max_parallel_maintenance_workers"))
+        logger.info("HNSW indexes ready")
+    except Exception as e:
+        logger.warning(f"Could not create HNSW indexes: {e}")
 
 
 def get_db() -> Session:
@@ -1,4 +1,3 @@
-from crewai import Agent, Task, Crew
 from app.core.models import EmailAnalysis
 
 def create_email_crew(llm, email_body: str) -> dict:
@@ -12,6 +11,8 @@ def create_email_crew(llm, email_body: str) -> dict:
     Returns:
         dict: The analysis as a dictionary
     """
+    # CrewAI is only needed on this legacy path, so defer its import cost
+    from crewai import Agent, Task, Crew
     
     # Define Agent
     assistant = Agent(
@@ -1,4 +1,3 @@
-from crewai import Agent, Task, Crew
 from app.core.models import TransactionExtracted
 
 def create_finance_crew(llm, text_input: str) -> dict:
@@ -12,6 +11,8 @@ def create_finance_crew(llm, text_input: str) -> dict:
     Returns:
         dict: The extracted data as a dictionary
     """
+    # CrewAI is only needed on this legacy path, so defer its import cost
+    from crewai import Agent, Task, Crew
     
     # Define Agent
     analyst = Agent(
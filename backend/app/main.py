@@ -6,8 +6,8 @@ includes routers, and configures background tasks.
 """
 
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from apscheduler.schedulers.background import BackgroundScheduler
 import logging
 from dotenv import load_dotenv
 
@@ -16,7 +16,6 @@ load_dotenv()
 
 from app.api import agents, health, transactions, finance, email, agent_logs, auth
 from app.database import init_db
-from app.services.email_collector import get_email_collector
 
 # Configure logging
 logging.basicConfig(
@@ -29,7 +28,8 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="Envoy AI",
     description="Your Personal Chief of Staff",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
 )
 
 # Configure CORS
@@ -50,12 +50,23 @@ app.include_router(finance.router, prefix="/api/finance", tags=["finance"])
 app.include_router(email.router, prefix="/api/email", tags=["email"])
 app.include_router(agent_logs.router, tags=["agent-logs"])
 
-# Initialize background scheduler
-scheduler = BackgroundScheduler()
+# Background scheduler, created on first use so apscheduler stays off the import path
+scheduler = None
+
+
+def get_scheduler():
+    """Get or create the background scheduler."""
+    global scheduler
+    if scheduler is None:
+        from apscheduler.schedulers.background import BackgroundScheduler
+        scheduler = BackgroundScheduler()
+    return scheduler
 
 
 def scheduled_email_processing():
     """Background task to process emails."""
+    from app.services.email_collector import get_email_collector
+
     try:
         logger.info("Running scheduled email processing...")
         collector = get_email_collector()
@@ -79,10 +90,15 @@ async def startup_event():
     init_db()
     logger.info("Database initialized")
     
+    # Batch agent execution logs instead of committing one per call
+    from app.services.ai_engine import get_ai_engine
+    get_ai_engine().start_log_flusher()
+    
     # DISABLED: Email processing blocks the server startup
     # Email processing on startup only (no scheduler for now)
     # logger.info("Triggering email processing on startup...")
     # try:
+    #     from app.services.email_collector import get_email_collector
     #     collector = get_email_collector()
     #     count = collector.process_unread_transactions()
     #     logger.info(f"Startup processing complete. Processed {count} emails.")
@@ -94,6 +110,9 @@ async def startup_event():
 async def shutdown_event():
     """Shutdown event handler."""
     logger.info("Shutting down Envoy AI application...")
-    if scheduler.running:
+    if scheduler is not None and scheduler.running:
         scheduler.shutdown()
     logger.info("Scheduler stopped")
+    
+    from app.services.ai_engine import get_ai_engine
+    await get_ai_engine().stop_log_flusher()
@@ -5,8 +5,8 @@ This module defines SQLAlchemy models for the application.
 """
 
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Boolean, ForeignKey, LargeBinary
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Boolean, ForeignKey, LargeBinary, Index
+from sqlalchemy.orm import declarative_base, relationship
 
 Base = declarative_base()
 
@@ -22,6 +22,8 @@ class User(Base):
     email = Column(String(255), unique=True, index=True, nullable=True)  # Optional for recovery
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    credentials = relationship("Credential", back_populates="user")
+    
     def __repr__(self):
         return f"<User(id={self.id}, username={self.username})>"
 
@@ -30,12 +32,16 @@ class Credential(Base):
     """WebAuthn credential model for passkey authentication."""
     
     __tablename__ = "credentials"
+    __table_args__ = (
+        # Login looks credentials up by owner + credential id in one probe
+        Index("ix_cred_user_credid", "user_id", "credential_id", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     
     # WebAuthn credential data
-    credential_id = Column(String(1024), unique=True, nullable=False, index=True)
+    credential_id = Column(LargeBinary, unique=True, nullable=False, index=True)  # Raw credential ID bytes
     public_key = Column(LargeBinary, nullable=False)
     sign_count = Column(Integer, default=0)
     transports = Column(Text)  # JSON array of supported transports
@@ -44,6 +50,8 @@ class Credential(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     last_used_at = Column(DateTime, nullable=True)
     
+    user = relationship("User", back_populates="credentials")
+    
     def __repr__(self):
         return f"<Credential(id={self.id}, user_id={self.user_id})>"
 
@@ -74,9 +82,11 @@ class Transaction(Base):
     email_date = Column(DateTime)
     
     # AI extracted data
-    raw_email_text = Column(Text)
     ai_analysis = Column(Text)  # JSON string of AI analysis
     
+    # Raw email body lives in transaction_raw; load it explicitly when needed
+    raw = relationship("TransactionRaw", uselist=False, lazy="raise_on_sql")
+    
     # Timestamps
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -88,6 +98,18 @@ class Transaction(Base):
         return f"<Transaction(id={self.id}, merchant={self.merchant}, amount={self.amount})>"
 
 
+class TransactionRaw(Base):
+    """Raw email text for a transaction, kept out of the hot transactions row."""
+    
+    __tablename__ = "transaction_raw"
+    
+    transaction_id = Column(Integer, ForeignKey("transactions.id", ondelete="CASCADE"), primary_key=True)
+    body = Column(Text)
+    
+    def __repr__(self):
+        return f"<TransactionRaw(transaction_id={self.transaction_id})>"
+
+
 class ProcessedEmail(Base):
     """Model to track processed emails and prevent duplicates."""
     
@@ -165,7 +187,7 @@ class AgentLog(Base):
     error_message = Column(Text)
     
     # Chain tracking for handoffs
-    parent_log_id = Column(Integer, index=True)  # For agent handoffs
+    parent_log_id = Column(String(36), index=True)  # Parent agent's run_id, for handoffs
     sequence_order = Column(Integer, default=0)  # Order in the chain
     
     # Extra data (JSON)
@@ -223,7 +245,7 @@ class UserCorrection(Base):
 # ------------------------------------------------------------------
 
 try:
-    from pgvector.sqlalchemy import Vector
+    from pgvector.sqlalchemy import HALFVEC
     PGVECTOR_AVAILABLE = True
 except ImportError:
     PGVECTOR_AVAILABLE = False
@@ -246,7 +268,7 @@ if PGVECTOR_AVAILABLE:
         urgency_score = Column(Integer)
         summary = Column(String(500))
         
-        embedding = Column(Vector(EMBEDDING_DIM), nullable=False)
+        embedding = Column(HALFVEC(EMBEDDING_DIM), nullable=False)  # FP16
         created_at = Column(DateTime, default=datetime.utcnow)
 
     class CorrectionEmbedding(Base):
@@ -263,5 +285,5 @@ if PGVECTOR_AVAILABLE:
         new_value = Column(String(500), nullable=False)
         content = Column(Text, nullable=False)  # Text used for embedding
         
-        embedding = Column(Vector(EMBEDDING_DIM), nullable=False)
+        embedding = Column(HALFVEC(EMBEDDING_DIM), nullable=False)  # FP16
         created_at = Column(DateTime, default=datetime.utcnow)
@@ -3,12 +3,19 @@ AI Engine with multi-model support, execution logging, and RAG context.
 """
 
 import os
+import time
+import asyncio
 import uuid
+import hashlib
 import logging
-import json
-from datetime import datetime
-from typing import Dict, Any, Optional
-from litellm import completion
+import threading
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
+
+from cachetools import TTLCache
 
 logger = logging.getLogger(__name__)
 
@@ -20,9 +27,99 @@ MODEL_CONFIG = {
     "default": "groq/llama-3.3-70b-versatile"
 }
 
+# Hard limit on an email triage call, opening the stream included
+EMAIL_STREAM_TIMEOUT = float(os.getenv("EMAIL_STREAM_TIMEOUT", "15.0"))
+
+# Base system prompts per agent; RAG context is appended when available
+FINANCE_SYSTEM_PROMPT = """You are a Financial Analyst. Extract transaction details.
+Return JSON: {"amount": <float>, "currency": "<INR/USD>", "vendor": "<name>", "category": "<Food/Transport/Shopping/Other>", "transaction_type": "<debit/credit>", "date": "<YYYY-MM-DD or null>", "is_subscription": <boolean>}"""
+
+EMAIL_SYSTEM_PROMPT = """You are an Executive Assistant triaging emails.
+Return JSON: {"category": "<Urgent/Finance/Work/Newsletter/Spam/Personal/Other>", "urgency_score": <1-10>, "summary": "<one sentence>", "action_required": <boolean>}"""
+
+CREDIT_CARD_SYSTEM_PROMPT = """You are a Credit Card Statement Analyst. Extract all transactions from the statement.
+
+For each transaction, extract:
+- date: Transaction date (YYYY-MM-DD)
+- description: Merchant/description
+- amount: Transaction amount (positive for credits/payments, negative for debits/purchases)
+- transaction_type: "debit" or "credit"
+- category: Shopping/Dining/Travel/Bills/Entertainment/Fuel/EMI/Other
+
+For EMI transactions, also extract:
+- is_emi: true
+- emi_principal: Principal amount
+- emi_interest: Interest amount
+- emi_gst: GST on interest (18%)
+- emi_remaining_months: Remaining EMI count if available
+
+Return JSON: {
+    "statement_date": "<YYYY-MM-DD>",
+    "card_last_4": "<last 4 digits>",
+    "total_due": <amount>,
+    "min_due": <amount>,
+    "due_date": "<YYYY-MM-DD>",
+    "transactions": [<list of transaction objects>],
+    "summary": {
+        "total_debits": <amount>,
+        "total_credits": <amount>,
+        "emi_count": <number>,
+        "emi_total": <amount>
+    }
+}"""
+
+FINANCE_RAG_HEADER = "Use this context from similar past emails to improve accuracy:"
+EMAIL_RAG_HEADER = "Use this context from similar past emails and user corrections to improve accuracy:"
+
+
+# RAG context per (user, text); bulk inbox syncs see many repeats
+_rag_context_cache: TTLCache = TTLCache(maxsize=2048, ttl=3600)
+_rag_context_lock = threading.Lock()
+
+
+def _rag_cache_key(text: str, user_id: Optional[int]) -> tuple:
+    return (user_id, hashlib.sha1(text.encode()).digest())
+
+
+# AgentLog writes are batched: flushed this long after the first queued log,
+# or once this many queue up
+LOG_FLUSH_INTERVAL = 0.1
+LOG_FLUSH_BATCH = 50
+
+# Most processed emails stored in RAG per upsert statement
+RAG_STORE_BATCH = 200
+
+
+def _write_logs(logs: list):
+    """Persist AgentLog rows with one commit on a dedicated session."""
+    from app.database import SessionLocal
+    
+    db = SessionLocal()
+    try:
+        db.bulk_save_objects(logs)
+        db.commit()
+    except Exception as e:
+        logger.error(f"Failed to write agent logs: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+@lru_cache(maxsize=None)
+def _acompletion():
+    """Import litellm on first use; it pulls in a large dependency tree."""
+    from litellm import acompletion
+    return acompletion
+
 
 class AIEngine:
-    """AI Engine with multi-model support and execution logging."""
+    """
+    AI Engine with multi-model support and execution logging.
+    
+    The agents' db_session argument only switches execution logging on:
+    any truthy value enables it, and the session itself is never used.
+    Logs are written later on the flusher's own session.
+    """
     
     def __init__(self):
         self.groq_key = os.getenv("GROQ_API_KEY")
@@ -41,82 +138,273 @@ class AIEngine:
         
         if not self.available:
             logger.error("❌ No API keys found! Set GROQ_API_KEY or OPENAI_API_KEY")
+        
+        # Resolve each agent's model once; fall back if its provider is unavailable
+        self._agent_to_model: Dict[str, str] = {}
+        for agent_type, model in MODEL_CONFIG.items():
+            provider = model.split("/")[0]
+            if provider not in self.providers:
+                fallback = MODEL_CONFIG["default"]
+                logger.warning(f"Provider {provider} not available for {agent_type}, falling back to {fallback}")
+                model = fallback
+            self._agent_to_model[agent_type] = model
+        
+        # In-flight LLM calls by prompt key, see _singleflight()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        
+        # Background AgentLog writer, started by start_log_flusher()
+        self._log_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._log_queue: Optional[asyncio.Queue] = None
+        self._log_task: Optional[asyncio.Task] = None
+        
+        # Embedding + upsert of processed emails runs here, off the request
+        # path; one worker keeps writes for the same email in order. Emails
+        # queued while a write is running go out together in the next one.
+        self._rag_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rag-store")
+        self._rag_pending: List[tuple] = []
+        self._rag_pending_lock = threading.Lock()
+        self._rag_flush_scheduled = False
     
     def get_model_for_agent(self, agent_type: str) -> str:
         """Get the configured model for an agent type."""
-        model = MODEL_CONFIG.get(agent_type, MODEL_CONFIG["default"])
+        return self._agent_to_model.get(agent_type, self._agent_to_model["default"])
+    
+    async def _acall_llm(self, model: str, system_prompt: str, user_prompt: str,
+                         cache_namespace: Optional[str] = None) -> str:
+        """Make a direct LLM call with specified model, serving repeats from the LLM cache."""
+        async def call() -> str:
+            hit, cache_entry = await self._cache_lookup(model, system_prompt, user_prompt, cache_namespace)
+            if hit is not None:
+                return hit
+            
+            stream = await self._acall_llm_stream(model, system_prompt, user_prompt)
+            content = await self._collect_json_stream(stream)
+            self._cache_store(cache_entry, content)
+            return content
+        
+        return await self._singleflight(model, system_prompt, user_prompt, call)
+
+    async def _singleflight(self, model: str, system_prompt: str, user_prompt: str, call):
+        """
+        Coalesce concurrent identical LLM calls.
         
-        # Check if provider is available, fallback if not
-        provider = model.split("/")[0]
-        if provider not in self.providers:
-            fallback = MODEL_CONFIG["default"]
-            logger.warning(f"Provider {provider} not available, falling back to {fallback}")
-            return fallback
+        The first caller for a prompt starts call() as its own task; callers
+        arriving while it is in flight await the same task instead of paying
+        for another completion. A caller that is cancelled stops waiting but
+        leaves the task running for the others.
+        """
+        from app.services.llm_cache import prompt_key
         
-        return model
-    
-    def _call_llm(self, model: str, system_prompt: str, user_prompt: str) -> str:
-        """Make a direct LLM call with specified model."""
-        response = completion(
+        key = prompt_key(model, system_prompt, user_prompt)
+        loop = asyncio.get_running_loop()
+        task = self._inflight.get(key)
+        if task is None or task.get_loop() is not loop:
+            task = loop.create_task(call())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._settle_inflight(key, t))
+        return await asyncio.shield(task)
+
+    def _settle_inflight(self, key: str, task: asyncio.Task) -> None:
+        """Drop a finished call from _inflight."""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # Mark retrieved in case every waiter was cancelled
+
+    async def _collect_json_stream(self, stream) -> str:
+        """
+        Assemble a streamed JSON response into its raw text.
+        
+        Chunks are kept in a list and only joined and parsed when a chunk
+        closes an object or array, so long responses are not re-copied
+        and re-parsed on every delta.
+        """
+        chunks: List[str] = []
+        try:
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content or ""
+                chunks.append(delta)
+                if delta.rstrip().endswith(("}", "]")):
+                    content = "".join(chunks)
+                    try:
+                        orjson.loads(content)
+                    except orjson.JSONDecodeError:
+                        continue
+                    return content
+        finally:
+            aclose = getattr(stream, "aclose", None)
+            if aclose:
+                await aclose()
+        return "".join(chunks)
+
+    async def _cache_lookup(self, model: str, system_prompt: str, user_prompt: str,
+                            cache_namespace: Optional[str] = None):
+        """
+        Look a prompt up in the LLM cache.
+        
+        Returns (hit, entry); pass entry to _cache_store once the LLM answers.
+        Near-duplicate matching is only tried for agents in NEAR_HIT_NAMESPACES
+        when LLM_CACHE_NEAR_HITS is on, and never across system prompts, so
+        neither another agent's answer nor another email's RAG context is
+        reused.
+        """
+        from app.services.llm_cache import (
+            get_llm_cache, prompt_key, embed_prompt, LLM_CACHE_NEAR_HITS, NEAR_HIT_NAMESPACES
+        )
+        
+        cache = get_llm_cache()
+        if cache is None:
+            return None, None
+        
+        key = prompt_key(model, system_prompt, user_prompt)
+        hit = cache.get(key)
+        if hit is not None:
+            return hit, None
+        
+        if not (LLM_CACHE_NEAR_HITS and cache_namespace in NEAR_HIT_NAMESPACES):
+            return None, (cache, key, None, "")
+        
+        namespace = f"{cache_namespace}:{prompt_key(model, system_prompt, '')}"
+        vec = await asyncio.to_thread(embed_prompt, user_prompt)
+        hit = cache.get(key, vec, namespace)
+        if hit is not None:
+            return hit, None
+        return None, (cache, key, vec, namespace)
+
+    def _cache_store(self, cache_entry, value: str):
+        """Store an LLM response for a prompt that missed the cache."""
+        if cache_entry is None:
+            return
+        cache, key, vec, namespace = cache_entry
+        cache.set(key, value, vec, namespace)
+
+    async def _acall_llm_stream(self, model: str, system_prompt: str, user_prompt: str):
+        """Make a streaming LLM call. Returns an async iterator of response chunks."""
+        return await _acompletion()(
             model=model,
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
             temperature=0.7,
-            response_format={"type": "json_object"}
+            response_format={"type": "json_object"},
+            stream=True
         )
-        return response.choices[0].message.content
 
     def _get_rag_context(self, text: str, user_id: Optional[int] = None) -> str:
         """Retrieve RAG context for the given text. Returns empty string if unavailable."""
+        key = _rag_cache_key(text, user_id)
+        with _rag_context_lock:
+            cached = _rag_context_cache.get(key)
+        if cached is not None:
+            return cached
+        
         try:
             from app.services.rag_service import get_rag_service
             rag = get_rag_service()
-            return rag.build_context_prompt(text, user_id)
+            context = rag.build_context_prompt(text, user_id)
         except Exception as e:
             logger.debug(f"RAG context unavailable: {e}")
             return ""
+        
+        with _rag_context_lock:
+            _rag_context_cache[key] = context
+        return context
+    
+    def invalidate_rag_context(self, user_id: Optional[int] = None) -> None:
+        """Forget cached RAG context for a user, so new corrections apply at once."""
+        with _rag_context_lock:
+            for key in [key for key in _rag_context_cache if key[0] == user_id]:
+                del _rag_context_cache[key]
+    
+    def _get_rag_context_batch(self, texts: List[str], user_id: Optional[int] = None) -> List[str]:
+        """
+        Retrieve RAG context for several texts.
+        
+        Duplicate and cached texts are skipped; the rest are embedded and
+        queried together in one round-trip.
+        """
+        keys = [_rag_cache_key(text, user_id) for text in texts]
+        contexts: Dict[tuple, str] = {}
+        with _rag_context_lock:
+            for key in keys:
+                cached = _rag_context_cache.get(key)
+                if cached is not None:
+                    contexts[key] = cached
+        
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in contexts:
+                missing.setdefault(key, text)
+        
+        if missing:
+            try:
+                from app.services.rag_service import get_rag_service
+                rag = get_rag_service()
+                fetched = rag.build_context_prompts(list(missing.values()), user_id)
+            except Exception as e:
+                logger.debug(f"RAG context unavailable: {e}")
+                fetched = None
+            
+            if fetched is not None:
+                with _rag_context_lock:
+                    for key, context in zip(missing, fetched):
+                        _rag_context_cache[key] = context
+                contexts.update(zip(missing, fetched))
+        
+        return [contexts.get(key, "") for key in keys]
 
     def _store_rag_context(self, email_id: Optional[int], text: str, analysis: dict, user_id: Optional[int] = None):
-        """Store processed email analysis in RAG for future context."""
+        """Queue processed email analysis for storage in RAG; does not wait for the write."""
         if not email_id:
             return
+        with self._rag_pending_lock:
+            self._rag_pending.append((email_id, text, dict(analysis), user_id))
+            if self._rag_flush_scheduled:
+                return
+            self._rag_flush_scheduled = True
+        self._rag_writer.submit(self._flush_rag_contexts)
+
+    def _flush_rag_contexts(self):
+        """Store all queued email analyses in RAG, RAG_STORE_BATCH per transaction."""
+        with self._rag_pending_lock:
+            items, self._rag_pending = self._rag_pending, []
+            self._rag_flush_scheduled = False
         try:
             from app.services.rag_service import get_rag_service
             rag = get_rag_service()
-            rag.store_email_context(email_id, text, analysis, user_id)
+            for i in range(0, len(items), RAG_STORE_BATCH):
+                rag.store_email_contexts(items[i:i + RAG_STORE_BATCH])
         except Exception as e:
             logger.debug(f"Failed to store RAG context: {e}")
 
-    def run_finance_agent(self, text: str, run_id: Optional[str] = None, 
-                          db_session=None, parent_log_id: Optional[int] = None,
-                          user_id: Optional[int] = None, email_id: Optional[int] = None) -> dict:
+    async def run_finance_agent(self, text: str, run_id: Optional[str] = None, 
+                                db_session=None, parent_log_id: Optional[str] = None,
+                                user_id: Optional[int] = None, email_id: Optional[int] = None) -> dict:
         """Extract financial transaction details with RAG context."""
         if not self.available:
             return {"error": "No API keys configured"}
         
         run_id = run_id or str(uuid.uuid4())
         model = self.get_model_for_agent("finance")
-        start_time = datetime.utcnow()
+        start_time = datetime.now(timezone.utc)
+        start_ns = time.perf_counter_ns()
         
         logger.info(f"Running Finance Agent with {model}...")
         
-        # Base prompt
-        system_prompt = """You are a Financial Analyst. Extract transaction details.
-Return JSON: {"amount": <float>, "currency": "<INR/USD>", "vendor": "<name>", "category": "<Food/Transport/Shopping/Other>", "transaction_type": "<debit/credit>", "date": "<YYYY-MM-DD or null>", "is_subscription": <boolean>}"""
-
         # Inject RAG context
-        rag_context = self._get_rag_context(text, user_id)
-        if rag_context:
-            system_prompt += f"\n\nUse this context from similar past emails to improve accuracy:\n{rag_context}"
+        rag_context = await asyncio.to_thread(self._get_rag_context, text, user_id)
+        system_prompt = (
+            f"{FINANCE_SYSTEM_PROMPT}\n\n{FINANCE_RAG_HEADER}\n{rag_context}"
+            if rag_context else FINANCE_SYSTEM_PROMPT
+        )
 
         try:
-            result = self._call_llm(model, system_prompt, f"Extract from:\n{text}")
-            parsed = json.loads(result)
+            result = await self._acall_llm(model, system_prompt, f"Extract from:\n{text}", "finance")
+            parsed = orjson.loads(result)
             
             # Log execution
-            self._log_execution(
+            await self._log_execution(
                 db_session=db_session,
                 run_id=run_id,
                 agent_name="finance",
@@ -124,6 +412,7 @@ Return JSON: {"amount": <float>, "currency": "<INR/USD>", "vendor": "<name>", "c
                 input_summary=text[:200],
                 output_summary=f"{parsed.get('vendor', 'Unknown')}: {parsed.get('amount', 0)}",
                 start_time=start_time,
+                start_ns=start_ns,
                 status="success",
                 parent_log_id=parent_log_id
             )
@@ -131,50 +420,46 @@ Return JSON: {"amount": <float>, "currency": "<INR/USD>", "vendor": "<name>", "c
             return parsed
         except Exception as e:
             logger.error(f"Finance Agent failed: {e}")
-            self._log_execution(
+            await self._log_execution(
                 db_session=db_session,
                 run_id=run_id,
                 agent_name="finance",
                 model_used=model,
                 input_summary=text[:200],
                 start_time=start_time,
+                start_ns=start_ns,
                 status="error",
                 error_message=str(e),
                 parent_log_id=parent_log_id
             )
             return {"error": str(e)}
 
-    def run_email_agent(self, text: str, run_id: Optional[str] = None, 
-                        db_session=None, user_id: Optional[int] = None,
-                        email_id: Optional[int] = None) -> dict:
+    async def run_email_agent(self, text: str, run_id: Optional[str] = None, 
+                              db_session=None, user_id: Optional[int] = None,
+                              email_id: Optional[int] = None) -> dict:
         """Analyze and categorize an email with RAG context."""
         if not self.available:
             return {"error": "No API keys configured"}
         
         run_id = run_id or str(uuid.uuid4())
         model = self.get_model_for_agent("email")
-        start_time = datetime.utcnow()
+        start_time = datetime.now(timezone.utc)
+        start_ns = time.perf_counter_ns()
             
         logger.info(f"Running Email Agent with {model}...")
         
-        # Base prompt
-        system_prompt = """You are an Executive Assistant triaging emails.
-Return JSON: {"category": "<Urgent/Finance/Work/Newsletter/Spam/Personal/Other>", "urgency_score": <1-10>, "summary": "<one sentence>", "action_required": <boolean>}"""
-
         # Inject RAG context
-        rag_context = self._get_rag_context(text, user_id)
-        if rag_context:
-            system_prompt += f"\n\nUse this context from similar past emails and user corrections to improve accuracy:\n{rag_context}"
+        rag_context = await asyncio.to_thread(self._get_rag_context, text, user_id)
+        system_prompt = self._email_system_prompt(rag_context)
 
         try:
-            result = self._call_llm(model, system_prompt, f"Analyze:\n{text}")
-            parsed = json.loads(result)
+            parsed = await self._triage_email(model, system_prompt, text)
             
             # Store in RAG for future context
             self._store_rag_context(email_id, text, parsed, user_id)
             
             # Log execution
-            log_id = self._log_execution(
+            await self._log_execution(
                 db_session=db_session,
                 run_id=run_id,
                 agent_name="email",
@@ -182,78 +467,138 @@ Return JSON: {"category": "<Urgent/Finance/Work/Newsletter/Spam/Personal/Other>"
                 input_summary=text[:200],
                 output_summary=f"{parsed.get('category', 'Unknown')}: {parsed.get('summary', '')[:100]}",
                 start_time=start_time,
+                start_ns=start_ns,
                 status="success"
             )
             
-            # Add log metadata for chaining
+            # Add run metadata for chaining (pass as parent_log_id)
             parsed["_run_id"] = run_id
-            parsed["_log_id"] = log_id
             
             return parsed
         except Exception as e:
             logger.error(f"Email Agent failed: {e}")
-            self._log_execution(
+            await self._log_execution(
                 db_session=db_session,
                 run_id=run_id,
                 agent_name="email",
                 model_used=model,
                 input_summary=text[:200],
                 start_time=start_time,
+                start_ns=start_ns,
                 status="error",
                 error_message=str(e)
             )
             return {"error": str(e)}
     
-    def run_credit_card_agent(self, text: str, run_id: Optional[str] = None,
-                              db_session=None) -> dict:
+    async def run_email_agent_batch(self, texts: List[str], db_session=None,
+                                    user_id: Optional[int] = None,
+                                    email_ids: Optional[List[Optional[int]]] = None) -> List[dict]:
+        """
+        Analyze several emails concurrently.
+        
+        All LLM calls are in flight at once, so a batch costs roughly one
+        round-trip instead of one per email. Results keep the input order.
+        """
+        if not self.available:
+            return [{"error": "No API keys configured"} for _ in texts]
+        if not texts:
+            return []
+        
+        email_ids = email_ids or [None] * len(texts)
+        model = self.get_model_for_agent("email")
+        start_time = datetime.now(timezone.utc)
+        start_ns = time.perf_counter_ns()
+        
+        logger.info(f"Running Email Agent batch of {len(texts)} with {model}...")
+        
+        rag_contexts = await asyncio.to_thread(self._get_rag_context_batch, texts, user_id)
+        outcomes = await asyncio.gather(
+            *(self._triage_email(model, self._email_system_prompt(rag_context), text)
+              for text, rag_context in zip(texts, rag_contexts)),
+            return_exceptions=True
+        )
+        
+        results = []
+        logs = []
+        for text, email_id, outcome in zip(texts, email_ids, outcomes):
+            run_id = str(uuid.uuid4())
+            if isinstance(outcome, BaseException):
+                logger.error(f"Email Agent failed: {outcome}")
+                logs.append(self._build_log(
+                    run_id=run_id,
+                    agent_name="email",
+                    model_used=model,
+                    input_summary=text[:200],
+                    start_time=start_time,
+                    start_ns=start_ns,
+                    status="error",
+                    error_message=str(outcome)
+                ))
+                results.append({"error": str(outcome)})
+                continue
+            
+            self._store_rag_context(email_id, text, outcome, user_id)
+            logs.append(self._build_log(
+                run_id=run_id,
+                agent_name="email",
+                model_used=model,
+                input_summary=text[:200],
+                output_summary=f"{outcome.get('category', 'Unknown')}: {outcome.get('summary', '')[:100]}",
+                start_time=start_time,
+                start_ns=start_ns,
+                status="success"
+            ))
+            outcome["_run_id"] = run_id
+            results.append(outcome)
+        
+        if db_session:
+            await self._enqueue_logs(logs)
+        
+        return results
+    
+    def _email_system_prompt(self, rag_context: str) -> str:
+        """Build the email triage system prompt, with RAG context if any."""
+        if rag_context:
+            return f"{EMAIL_SYSTEM_PROMPT}\n\n{EMAIL_RAG_HEADER}\n{rag_context}"
+        return EMAIL_SYSTEM_PROMPT
+    
+    async def _triage_email(self, model: str, system_prompt: str, text: str) -> dict:
+        """
+        Run a single email triage call.
+        
+        Goes through _acall_llm, whose stream reader stops and closes the
+        stream as soon as the JSON object is complete. Downstream needs
+        category and summary as well as the urgency fields, so the object
+        is not cut short. A stalled stream fails the triage instead of
+        hanging it.
+        """
+        try:
+            async with asyncio.timeout(EMAIL_STREAM_TIMEOUT):
+                content = await self._acall_llm(model, system_prompt, f"Analyze:\n{text}", "email")
+        except TimeoutError:
+            raise TimeoutError(f"Email triage exceeded {EMAIL_STREAM_TIMEOUT}s") from None
+        return orjson.loads(content)
+    
+    async def run_credit_card_agent(self, text: str, run_id: Optional[str] = None,
+                                    db_session=None) -> dict:
         """Extract credit card statement transactions including EMI details."""
         if not self.available:
             return {"error": "No API keys configured"}
         
         run_id = run_id or str(uuid.uuid4())
         model = self.get_model_for_agent("credit_card")
-        start_time = datetime.utcnow()
+        start_time = datetime.now(timezone.utc)
+        start_ns = time.perf_counter_ns()
         
         logger.info(f"Running Credit Card Agent with {model}...")
         
-        system_prompt = """You are a Credit Card Statement Analyst. Extract all transactions from the statement.
-
-For each transaction, extract:
-- date: Transaction date (YYYY-MM-DD)
-- description: Merchant/description
-- amount: Transaction amount (positive for credits/payments, negative for debits/purchases)
-- transaction_type: "debit" or "credit"
-- category: Shopping/Dining/Travel/Bills/Entertainment/Fuel/EMI/Other
-
-For EMI transactions, also extract:
-- is_emi: true
-- emi_principal: Principal amount
-- emi_interest: Interest amount
-- emi_gst: GST on interest (18%)
-- emi_remaining_months: Remaining EMI count if available
-
-Return JSON: {
-    "statement_date": "<YYYY-MM-DD>",
-    "card_last_4": "<last 4 digits>",
-    "total_due": <amount>,
-    "min_due": <amount>,
-    "due_date": "<YYYY-MM-DD>",
-    "transactions": [<list of transaction objects>],
-    "summary": {
-        "total_debits": <amount>,
-        "total_credits": <amount>,
-        "emi_count": <number>,
-        "emi_total": <amount>
-    }
-}"""
-
         try:
-            result = self._call_llm(model, system_prompt, f"Extract from statement:\n{text}")
-            parsed = json.loads(result)
+            result = await self._acall_llm(model, CREDIT_CARD_SYSTEM_PROMPT, f"Extract from statement:\n{text}", "credit_card")
+            parsed = orjson.loads(result)
             
             # Log execution
             tx_count = len(parsed.get("transactions", []))
-            self._log_execution(
+            await self._log_execution(
                 db_session=db_session,
                 run_id=run_id,
                 agent_name="credit_card",
@@ -261,60 +606,134 @@ Return JSON: {
                 input_summary=text[:200],
                 output_summary=f"Extracted {tx_count} transactions, Total: {parsed.get('total_due', 0)}",
                 start_time=start_time,
+                start_ns=start_ns,
                 status="success"
             )
             
             return parsed
         except Exception as e:
             logger.error(f"Credit Card Agent failed: {e}")
-            self._log_execution(
+            await self._log_execution(
                 db_session=db_session,
                 run_id=run_id,
                 agent_name="credit_card",
                 model_used=model,
                 input_summary=text[:200],
                 start_time=start_time,
+                start_ns=start_ns,
                 status="error",
                 error_message=str(e)
             )
             return {"error": str(e)}
     
-    def _log_execution(self, db_session, run_id: str, agent_name: str, 
+    async def _log_execution(self, db_session, run_id: str, agent_name: str, 
                        model_used: str, input_summary: str, start_time: datetime,
-                       status: str, output_summary: str = None, 
-                       error_message: str = None, parent_log_id: int = None) -> Optional[int]:
-        """Log agent execution to database."""
+                       start_ns: int, status: str, output_summary: str = None, 
+                       error_message: str = None, parent_log_id: str = None):
+        """
+        Queue an agent execution log for the background writer.
+        
+        db_session is only a switch: when falsy nothing is logged.
+        """
         if not db_session:
-            return None
+            return
         
         try:
-            from app.models import AgentLog
-            
-            end_time = datetime.utcnow()
-            duration_ms = int((end_time - start_time).total_seconds() * 1000)
-            
-            log = AgentLog(
+            log = self._build_log(
                 run_id=run_id,
                 agent_name=agent_name,
                 model_used=model_used,
                 input_summary=input_summary,
-                output_summary=output_summary,
-                started_at=start_time,
-                completed_at=end_time,
-                duration_ms=duration_ms,
+                start_time=start_time,
+                start_ns=start_ns,
                 status=status,
+                output_summary=output_summary,
                 error_message=error_message,
                 parent_log_id=parent_log_id
             )
-            
-            db_session.add(log)
-            db_session.commit()
-            db_session.refresh(log)
-            
-            return log.id
+            await self._enqueue_logs([log])
         except Exception as e:
             logger.error(f"Failed to log execution: {e}")
-            return None
+    
+    async def _enqueue_logs(self, logs: list):
+        """Hand logs to the flusher, or write them in a worker thread if it is not running."""
+        if self._log_task is None:
+            await asyncio.to_thread(_write_logs, logs)
+            return
+        for log in logs:
+            # Thread-safe: agents may also run outside the main event loop.
+            # Scheduled puts keep FIFO order with the shutdown sentinel.
+            self._log_loop.call_soon_threadsafe(self._log_queue.put_nowait, log)
+    
+    def start_log_flusher(self):
+        """Start batching AgentLog writes in the background. Call from the event loop."""
+        if self._log_task is not None:
+            return
+        self._log_loop = asyncio.get_running_loop()
+        self._log_queue = asyncio.Queue()
+        self._log_task = asyncio.create_task(self._flush_logs())
+    
+    async def stop_log_flusher(self):
+        """Write any queued logs and stop the flusher."""
+        if self._log_task is None:
+            return
+        self._log_loop.call_soon_threadsafe(self._log_queue.put_nowait, None)
+        await self._log_task
+        self._log_task = None
+    
+    async def _flush_logs(self):
+        """
+        Write queued logs at most LOG_FLUSH_INTERVAL seconds after the first
+        one of a batch arrives, or as soon as LOG_FLUSH_BATCH are waiting.
+        """
+        loop = asyncio.get_running_loop()
+        batch = []
+        deadline = 0.0
+        while True:
+            # Idle with an empty batch; otherwise wait only until the deadline
+            timeout = max(deadline - loop.time(), 0) if batch else None
+            try:
+                log = await asyncio.wait_for(self._log_queue.get(), timeout)
+            except asyncio.TimeoutError:
+                log = False
+            
+            if log is None:  # Shutdown sentinel
+                if batch:
+                    await asyncio.to_thread(_write_logs, batch)
+                return
+            if log is not False:
+                if not batch:
+                    deadline = loop.time() + LOG_FLUSH_INTERVAL
+                batch.append(log)
+                if len(batch) < LOG_FLUSH_BATCH and loop.time() < deadline:
+                    continue
+            if batch:
+                await asyncio.to_thread(_write_logs, batch)
+                batch = []
+    
+    def _build_log(self, run_id: str, agent_name: str, model_used: str,
+                   input_summary: str, start_time: datetime, start_ns: int, status: str,
+                   output_summary: str = None, error_message: str = None,
+                   parent_log_id: str = None):
+        """Build an AgentLog row for an execution that just finished."""
+        from app.models import AgentLog
+        
+        end_time = datetime.now(timezone.utc)
+        duration_ms = (time.perf_counter_ns() - start_ns) // 1_000_000
+        
+        return AgentLog(
+            run_id=run_id,
+            agent_name=agent_name,
+            model_used=model_used,
+            input_summary=input_summary,
+            output_summary=output_summary,
+            started_at=start_time,
+            completed_at=end_time,
+            duration_ms=duration_ms,
+            status=status,
+            error_message=error_message,
+            parent_log_id=parent_log_id
+        )
 
 
 ai_engine = AIEngine()
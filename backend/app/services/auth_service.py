@@ -5,36 +5,55 @@ This module handles WebAuthn registration/login and JWT token management.
 """
 
 import os
+import hmac
+import asyncio
+import time
+import hashlib
 import secrets
 import logging
-from datetime import datetime, timedelta
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
 from typing import Optional, Dict, Any
-import json
-import base64
+import orjson
 
-from jose import JWTError, jwt
+from cachetools import TTLCache
+
+# SIMD base64 when available; same API as the stdlib functions
+try:
+    from pybase64 import urlsafe_b64decode, urlsafe_b64encode
+except ImportError:
+    from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+import jwt
 from webauthn import (
     generate_registration_options,
     verify_registration_response,
     generate_authentication_options,
     verify_authentication_response,
-    options_to_json,
 )
+from webauthn.helpers import bytes_to_base64url, options_to_json_dict
 from webauthn.helpers.structs import (
-    PublicKeyCredentialDescriptor,
     AuthenticatorTransport,
     UserVerificationRequirement,
     AuthenticatorSelectionCriteria,
 )
 from webauthn.helpers.cose import COSEAlgorithmIdentifier
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, contains_eager, selectinload
 
 from app.models import User, Credential
 
 logger = logging.getLogger(__name__)
 
 # Configuration from environment
-JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", secrets.token_urlsafe(32))
+# Fail fast: a per-process random default would invalidate tokens on every
+# restart and across workers.
+JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
+if not JWT_SECRET_KEY:
+    raise RuntimeError("JWT_SECRET_KEY is not set; generate one with `openssl rand -hex 32`")
+# Encoded once so PyJWT does not re-encode the key on every call
+JWT_SECRET_KEY_BYTES = JWT_SECRET_KEY.encode("utf-8")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 JWT_EXPIRATION_MINUTES = int(os.getenv("JWT_EXPIRATION_MINUTES", "10080"))  # 7 days
 
@@ -42,26 +61,119 @@ JWT_EXPIRATION_MINUTES = int(os.getenv("JWT_EXPIRATION_MINUTES", "10080"))  # 7
 RP_ID = os.getenv("RP_ID", "localhost")
 RP_NAME = os.getenv("RP_NAME", "Envoy AI")
 RP_ORIGIN = os.getenv("RP_ORIGIN", "http://localhost:3000")
+CHALLENGE_TTL_SECONDS = int(os.getenv("WEBAUTHN_CHALLENGE_TTL", "300"))
+
+# Shared challenge storage for multi-worker deployments
+REDIS_URL = os.getenv("REDIS_URL")
+
+# CBOR decoding and signature checks run here so they don't block the event loop
+_VERIFY_POOL = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="webauthn")
+
+
+async def _run_verify(func, **kwargs):
+    """Run a webauthn verify_* call on the verification pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_VERIFY_POOL, partial(func, **kwargs))
+
+
+class ChallengeStore:
+    """
+    Pending WebAuthn challenges keyed by username, expiring after a TTL.
+
+    Uses Redis when REDIS_URL is set so a challenge issued by one worker
+    can be verified by another. Falls back to an in-process TTL cache,
+    which is only correct with a single worker.
+    """
+
+    PREFIX = "webauthn:chal:"
+
+    def __init__(self, redis_url: Optional[str] = REDIS_URL, ttl: int = CHALLENGE_TTL_SECONDS):
+        self.ttl = ttl
+        self._redis = None
+        self._local: Optional[TTLCache] = None
+        if redis_url:
+            try:
+                import redis.asyncio as redis
+                self._redis = redis.from_url(redis_url)
+            except ImportError:
+                logger.warning("redis not installed, storing WebAuthn challenges in memory")
+        if self._redis is None:
+            self._local = TTLCache(maxsize=10000, ttl=ttl)
+
+    async def set(self, username: str, challenge: bytes) -> None:
+        if self._redis is not None:
+            await self._redis.setex(self.PREFIX + username, self.ttl, challenge)
+        else:
+            self._local[username] = challenge
+
+    async def pop(self, username: str) -> Optional[bytes]:
+        """Fetch and remove a challenge in one step, so it can only be used once."""
+        if self._redis is not None:
+            return await self._redis.getdel(self.PREFIX + username)
+        return self._local.pop(username, None)
+
+
+_VALID_TRANSPORTS = frozenset(e.value for e in AuthenticatorTransport)
+
+
+@lru_cache(maxsize=256)
+def _parse_transports(raw: str) -> tuple:
+    """Valid transports from a stored JSON list; most rows share a few values."""
+    return tuple(t for t in orjson.loads(raw) if t in _VALID_TRANSPORTS)
+
+
+# HS256 fast path for signing: the keyed HMAC state and the fixed header are
+# built once, so each token only hashes its own payload.
+_HS256_SIGNER = hmac.new(JWT_SECRET_KEY_BYTES, digestmod=hashlib.sha256)
+_HS256_HEADER_B64 = urlsafe_b64encode(b'{"alg":"HS256","typ":"JWT"}').rstrip(b"=")
+
+
+def _b64url(data: bytes) -> bytes:
+    return urlsafe_b64encode(data).rstrip(b"=")
+
+
+def _b64url_decode(data: str) -> bytes:
+    """Decode unpadded base64url, as sent by browsers for credential IDs."""
+    return urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign_hs256(claims: dict) -> str:
+    """Encode and sign a JWT with HS256; output verifies with PyJWT."""
+    signing_input = _HS256_HEADER_B64 + b"." + _b64url(orjson.dumps(claims))
+    signature = _HS256_SIGNER.copy()
+    signature.update(signing_input)
+    return (signing_input + b"." + _b64url(signature.digest())).decode("ascii")
+
+
+# Decoded token payloads, so repeat requests skip signature verification.
+# Entries never outlive the token lifetime; exp is still checked on every hit.
+_token_cache: TTLCache = TTLCache(maxsize=8192, ttl=JWT_EXPIRATION_MINUTES * 60)
+_token_cache_lock = threading.Lock()
 
 
 class AuthService:
     """Service for handling authentication operations."""
     
     def __init__(self):
-        self.challenges: Dict[str, str] = {}  # In-memory challenge storage
-
-    def _reg_options(self, username: str, display_name: str) -> dict:
-        """Generate WebAuthn registration options."""
-        challenge = secrets.token_bytes(32)
-        self.challenges[username] = challenge.hex()
-
+        self.challenges = ChallengeStore()
+        self._reg_template = self._build_reg_template()
+        self._auth_template = self._build_auth_template()
+
+    @staticmethod
+    def _build_reg_template() -> dict:
+        """
+        Registration options with placeholder challenge and user.
+        
+        Everything else is identical across requests, so it is built and
+        serialized once instead of on every registration.
+        """
         options = generate_registration_options(
             rp_id=RP_ID,
             rp_name=RP_NAME,
-            user_id=username.encode("utf-8"),
-            user_name=username,
-            user_display_name=display_name,
-            challenge=challenge,
+            user_id=b"_",
+            user_name="_",
+            user_display_name="_",
+            challenge=bytes(32),
             supported_pub_key_algs=[
                 COSEAlgorithmIdentifier.ECDSA_SHA_256,
                 COSEAlgorithmIdentifier.RSASSA_PKCS1_v1_5_SHA_256,
@@ -70,20 +182,47 @@ class AuthService:
                 user_verification=UserVerificationRequirement.PREFERRED,
             ),
         )
+        return options_to_json_dict(options)
+
+    @staticmethod
+    def _build_auth_template() -> dict:
+        """Authentication options with placeholder challenge and credentials."""
+        options = generate_authentication_options(
+            rp_id=RP_ID,
+            challenge=bytes(32),
+            user_verification=UserVerificationRequirement.PREFERRED,
+        )
+        return options_to_json_dict(options)
 
-        return json.loads(options_to_json(options))
+    async def _reg_options(self, username: str, display_name: str) -> dict:
+        """Generate WebAuthn registration options."""
+        challenge = secrets.token_bytes(32)
+        await self.challenges.set(username, challenge)
+
+        return {
+            **self._reg_template,
+            "challenge": bytes_to_base64url(challenge),
+            "user": {
+                "id": bytes_to_base64url(username.encode("utf-8")),
+                "name": username,
+                "displayName": display_name,
+            },
+        }
 
-    def generate_registration_options_for_user(
+    async def generate_registration_options_for_user(
         self, username: str, display_name: str, db: Session
     ) -> dict:
         """Generate WebAuthn registration options for a new user."""
-        existing = db.query(User).filter(User.username == username).first()
+        # Session work runs in a worker thread so it doesn't block the event loop
+        existing = await asyncio.to_thread(
+            lambda: db.query(User.id).filter(User.username == username).first()
+        )
         if existing:
             raise ValueError("Username already exists")
 
-        return self._reg_options(username, display_name)
+        return await self._reg_options(username, display_name)
 
-    def verify_registration(
+    async def verify_registration(
         self,
         username: str,
         display_name: str,
@@ -91,16 +230,15 @@ class AuthService:
         db: Session,
     ) -> User:
         """Verify registration response and create user + credential."""
-        challenge_hex = self.challenges.get(username)
-        if not challenge_hex:
+        challenge = await self.challenges.pop(username)
+        if not challenge:
             raise ValueError("No registration in progress for this user")
 
-        challenge = bytes.fromhex(challenge_hex)
-
         logger.info("Verifying registration for user=%s, rp_id=%s, origin=%s", username, RP_ID, RP_ORIGIN)
 
         try:
-            verification = verify_registration_response(
+            verification = await _run_verify(
+                verify_registration_response,
                 credential=credential_data,
                 expected_challenge=challenge,
                 expected_rp_id=RP_ID,
@@ -110,7 +248,16 @@ class AuthService:
             logger.error("Registration verification failed: %s", exc)
             raise ValueError(f"Registration verification failed: {exc}")
 
-        # Create user
+        user = await asyncio.to_thread(
+            self._create_user, username, display_name, credential_data, verification, db
+        )
+        logger.info("User registered: id=%d username=%s", user.id, user.username)
+        return user
+
+    @staticmethod
+    def _create_user(username: str, display_name: str, credential_data: dict,
+                     verification, db: Session) -> User:
+        """Insert a verified user and their first credential (blocking)."""
         user = User(username=username, display_name=display_name)
         db.add(user)
         db.flush()
@@ -122,110 +269,100 @@ class AuthService:
 
         credential = Credential(
             user_id=user.id,
-            credential_id=verification.credential_id.hex(),
+            credential_id=verification.credential_id,
             public_key=verification.credential_public_key,
             sign_count=verification.sign_count,
-            transports=json.dumps(transports_raw),
+            transports=orjson.dumps(transports_raw).decode(),
         )
         db.add(credential)
         db.commit()
         db.refresh(user)
-
-        del self.challenges[username]
-        logger.info("User registered: id=%d username=%s", user.id, user.username)
         return user
 
-    def generate_authentication_options_for_user(
+    async def generate_authentication_options_for_user(
         self, username: str, db: Session
     ) -> dict:
         """Generate WebAuthn authentication options for login."""
-        user = db.query(User).filter(User.username == username).first()
+        user = await asyncio.to_thread(
+            lambda: db.query(User)
+            .options(selectinload(User.credentials))
+            .filter(User.username == username)
+            .first()
+        )
         if not user:
             raise ValueError("User not found")
 
-        credentials = (
-            db.query(Credential).filter(Credential.user_id == user.id).all()
-        )
+        credentials = user.credentials
         if not credentials:
             raise ValueError("No credentials found for user")
 
         challenge = secrets.token_bytes(32)
-        self.challenges[username] = challenge.hex()
+        await self.challenges.set(username, challenge)
 
         allow_credentials = []
         for cred in credentials:
             try:
-                stored_transports = json.loads(cred.transports or "[]")
-                transports = [
-                    AuthenticatorTransport(t)
-                    for t in stored_transports
-                    if t in [e.value for e in AuthenticatorTransport]
-                ]
+                transports = list(_parse_transports(cred.transports or "[]"))
             except Exception:
                 transports = []
 
-            allow_credentials.append(
-                PublicKeyCredentialDescriptor(
-                    id=bytes.fromhex(cred.credential_id),
-                    transports=transports if transports else None,
-                )
-            )
-
-        options = generate_authentication_options(
-            rp_id=RP_ID,
-            challenge=challenge,
-            allow_credentials=allow_credentials,
-            user_verification=UserVerificationRequirement.PREFERRED,
-        )
-
-        return json.loads(options_to_json(options))
+            descriptor = {
+                "id": bytes_to_base64url(cred.credential_id),
+                "type": "public-key",
+            }
+            if transports:
+                descriptor["transports"] = transports
+            allow_credentials.append(descriptor)
+
+        return {
+            **self._auth_template,
+            "challenge": bytes_to_base64url(challenge),
+            "allowCredentials": allow_credentials,
+        }
 
-    def verify_authentication(
+    async def verify_authentication(
         self,
         username: str,
         credential_data: dict,
         db: Session,
     ) -> User:
         """Verify authentication response and return user."""
-        challenge_hex = self.challenges.get(username)
-        if not challenge_hex:
+        challenge = await self.challenges.pop(username)
+        if not challenge:
             raise ValueError("No authentication in progress for this user")
 
-        challenge = bytes.fromhex(challenge_hex)
-
-        user = db.query(User).filter(User.username == username).first()
-        if not user:
-            raise ValueError("User not found")
-
         # Find credential by rawId (base64url) or id field
         raw_id = credential_data.get("rawId") or credential_data.get("id", "")
         try:
             # rawId comes as base64url from SimpleWebAuthn
-            cred_id_bytes = base64.urlsafe_b64decode(raw_id + "==")
-            cred_id_hex = cred_id_bytes.hex()
+            cred_id = _b64url_decode(raw_id)
         except Exception:
-            cred_id_hex = raw_id
+            raise ValueError("Invalid credential id")
 
-        credential = (
-            db.query(Credential)
+        credential = await asyncio.to_thread(
+            lambda: db.query(Credential)
+            .join(User)
             .filter(
-                Credential.user_id == user.id,
-                Credential.credential_id == cred_id_hex,
+                User.username == username,
+                Credential.credential_id == cred_id,
             )
+            .options(contains_eager(Credential.user))  # User comes from the same row
             .first()
         )
 
         if not credential:
             logger.error(
-                "Credential not found for user=%s, cred_id_hex=%s",
-                username, cred_id_hex,
+                "Credential not found for user=%s, cred_id=%s",
+                username, raw_id,
             )
             raise ValueError("Credential not found")
 
+        user = credential.user
         logger.info("Verifying authentication for user=%s", username)
 
         try:
-            verification = verify_authentication_response(
+            verification = await _run_verify(
+                verify_authentication_response,
                 credential=credential_data,
                 expected_challenge=challenge,
                 expected_rp_id=RP_ID,
@@ -237,31 +374,63 @@ class AuthService:
             logger.error("Authentication verification failed: %s", exc)
             raise ValueError(f"Authentication verification failed: {exc}")
 
-        credential.sign_count = verification.new_sign_count
-        credential.last_used_at = datetime.utcnow()
-        db.commit()
+        await asyncio.to_thread(self._record_sign_in, credential, verification.new_sign_count, db)
 
-        del self.challenges[username]
         logger.info("User authenticated: id=%d username=%s", user.id, user.username)
         return user
 
+    @staticmethod
+    def _record_sign_in(credential: Credential, sign_count: int, db: Session) -> None:
+        """Persist the new sign count (blocking); reloads the user for the caller."""
+        credential.sign_count = sign_count
+        credential.last_used_at = datetime.utcnow()
+        db.commit()
+        db.refresh(credential.user)
+
     def create_access_token(self, user_id: int, username: str) -> str:
         """Create JWT access token."""
-        expire = datetime.utcnow() + timedelta(minutes=JWT_EXPIRATION_MINUTES)
+        # Epoch seconds, as they appear in the token
+        expire = int(time.time()) + JWT_EXPIRATION_MINUTES * 60
+        if JWT_ALGORITHM == "HS256":
+            return _sign_hs256({
+                "sub": str(user_id),
+                "username": username,
+                "exp": expire,
+            })
         to_encode = {
             "sub": str(user_id),
             "username": username,
             "exp": expire,
         }
-        return jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
+        return jwt.encode(to_encode, JWT_SECRET_KEY_BYTES, algorithm=JWT_ALGORITHM)
 
     def verify_token(self, token: str) -> Optional[Dict[str, Any]]:
         """Verify JWT token and return payload."""
+        with _token_cache_lock:
+            payload = _token_cache.get(token)
+        if payload is not None:
+            # Signature was already verified; only expiry can change.
+            # Callers get their own copy, so edits never reach the cache.
+            if payload.get("exp", 0) > time.time():
+                return dict(payload)
+            with _token_cache_lock:
+                _token_cache.pop(token, None)
+            return None
+
         try:
-            return jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
-        except JWTError:
+            payload = jwt.decode(
+                token,
+                JWT_SECRET_KEY_BYTES,
+                algorithms=[JWT_ALGORITHM],
+                options={"require": ["exp", "sub"], "verify_aud": False},
+            )
+        except jwt.PyJWTError:
             return None
 
+        with _token_cache_lock:
+            _token_cache[token] = payload
+        return dict(payload)
+
 
 # Global instance
 auth_service = AuthService()
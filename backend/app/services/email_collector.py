@@ -4,8 +4,7 @@ Email Collector Service - Optimized for speed.
 
 import logging
 from datetime import datetime
-from typing import Set
-from imap_tools import MailBox, AND
+from typing import Dict, List, Set
 from sqlalchemy.orm import Session
 
 from app.core.config import get_settings
@@ -14,6 +13,11 @@ from app.models import Email
 
 logger = logging.getLogger(__name__)
 
+# New emails are inserted and committed in batches of this size
+EMAIL_INSERT_BATCH = 200
+# Maximum messages looked at per sync
+EMAIL_FETCH_LIMIT = 100
+
 
 class EmailCollector:
     """Email collector - fetches and stores emails for AI processing."""
@@ -24,22 +28,20 @@ class EmailCollector:
     def process_unread_transactions(self, since_date: datetime = None, user_id: int = None) -> int:
         """
         Fetch new emails from IMAP and save to database.
-        Optimized: Pre-loads existing message IDs to avoid per-email DB queries.
+        Optimized: UIDs are searched first and only messages not already
+        stored are downloaded; the unique message_id + ON CONFLICT DO NOTHING
+        still guards against races with a concurrent sync.
         """
         if not self.settings.email_user or not self.settings.email_pass:
             logger.warning("Email credentials not configured.")
             return 0
         
+        from imap_tools import MailBox, AND, MailMessageFlags
+
         new_count = 0
         db = SessionLocal()
         
         try:
-            # Pre-load all existing message IDs in ONE query for fast duplicate check
-            existing_ids: Set[str] = set(
-                row[0] for row in db.query(Email.message_id).all()
-            )
-            logger.info(f"Loaded {len(existing_ids)} existing email IDs")
-            
             with MailBox(self.settings.imap_server).login(
                 self.settings.email_user,
                 self.settings.email_pass
@@ -55,37 +57,45 @@ class EmailCollector:
                     criteria = AND(seen=False)
                     logger.info("Fetching unread emails")
                 
-                # Fetch emails
-                for msg in mailbox.fetch(criteria, limit=100):  # Limit to 100 for speed
-                    msg_id = str(msg.uid)
+                # UID SEARCH only - no headers or bodies are transferred yet
+                uids = mailbox.uids(criteria)[:EMAIL_FETCH_LIMIT]
+                existing = self._existing_ids(db, uids)
+                new_uids = [uid for uid in uids if uid not in existing]
+                
+                # Already-stored messages are not downloaded, but still get
+                # marked seen as a fetch would have done
+                if existing:
+                    mailbox.flag(existing, MailMessageFlags.SEEN, True)
+                if not new_uids:
+                    logger.info("No new emails")
+                    return 0
+                
+                pending: List[Dict] = []
+                
+                # Fetch bodies of new emails only, in one FETCH command (bulk)
+                # instead of one round-trip per message
+                for msg in mailbox.fetch(AND(uid=new_uids), bulk=True):
+                    msg_id = msg.uid  # imap_tools already returns the UID as str
                     
-                    # Fast in-memory duplicate check
-                    if msg_id in existing_ids:
-                        continue  # Skip silently - no DB query, no log spam
+                    # Queue for the next batch insert; duplicates are dropped there
+                    pending.append(dict(
+                        user_id=user_id,
+                        message_id=msg_id,
+                        subject=msg.subject or "(No Subject)",
+                        sender=msg.from_ or "Unknown",
+                        recipient=msg.to[0] if msg.to else "",
+                        date=msg.date,
+                        body_text=msg.text or "",
+                        body_html=msg.html or "",
+                        processing_status="pending"
+                    ))
                     
-                    # New email - save it
-                    try:
-                        email = Email(
-                            user_id=user_id,
-                            message_id=msg_id,
-                            subject=msg.subject or "(No Subject)",
-                            sender=msg.from_ or "Unknown",
-                            recipient=msg.to[0] if msg.to else "",
-                            date=msg.date,
-                            body_text=msg.text or "",
-                            body_html=msg.html or "",
-                            processing_status="pending"
-                        )
-                        db.add(email)
-                        db.flush()  # Get ID without full commit
-                        existing_ids.add(msg_id)  # Update cache
-                        new_count += 1
-                        logger.info(f"New: {msg.subject[:50]}...")
-                    except Exception as e:
-                        logger.error(f"Error saving: {e}")
-                        db.rollback()
+                    if len(pending) >= EMAIL_INSERT_BATCH:
+                        new_count += self._insert_batch(db, pending)
+                        pending = []
                 
-                db.commit()
+                if pending:
+                    new_count += self._insert_batch(db, pending)
                 
         except Exception as e:
             logger.error(f"Email sync error: {e}")
@@ -94,6 +104,55 @@ class EmailCollector:
         
         logger.info(f"Synced {new_count} new emails")
         return new_count
+    
+    def _existing_ids(self, db: Session, uids: List[str]) -> Set[str]:
+        """Subset of the given IMAP UIDs already stored as emails."""
+        if not uids:
+            return set()
+        rows = db.query(Email.message_id).filter(Email.message_id.in_(uids))
+        return {message_id for (message_id,) in rows}
+    
+    def _insert_batch(self, db: Session, rows: List[Dict]) -> int:
+        """
+        Insert email rows in one statement, ignoring already-stored message IDs.
+        
+        Returns the number of rows actually inserted. On failure, retries
+        one by one so a single bad row is skipped.
+        """
+        try:
+            inserted = self._insert_new(db, rows)
+            db.commit()
+            return inserted
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Batch insert failed, retrying row by row: {e}")
+        
+        saved = 0
+        for row in rows:
+            try:
+                saved += self._insert_new(db, [row])
+                db.commit()
+            except Exception as e:
+                logger.error(f"Error saving: {e}")
+                db.rollback()
+        return saved
+    
+    def _insert_new(self, db: Session, rows: List[Dict]) -> int:
+        """INSERT ... ON CONFLICT (message_id) DO NOTHING; returns rows inserted."""
+        if db.bind.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        
+        stmt = (
+            insert(Email)
+            .on_conflict_do_nothing(index_elements=["message_id"])
+            .returning(Email.subject)
+        )
+        inserted = db.execute(stmt, rows).scalars().all()
+        for subject in inserted:
+            logger.info(f"New: {(subject or '')[:50]}...")
+        return len(inserted)
 
 
 # Singleton
@@ -1,6 +1,65 @@
-from typing import Any, List, Dict
+import re
+from functools import lru_cache
+from typing import Any, List, Dict, Final, Optional, Tuple
 from app.core.agent_base import BaseAgent, TaskPacket, AgentTool
-from app.services.llm_factory import LLMFactory
+from app.services.llm_factory import get_llm_factory
+
+# Compiled once; searched in C and stop at the first match like any()
+_DIGIT_RE = re.compile(r"\d")  # Decimal digits only, a subset of str.isdigit()
+_SPECIAL_RE = re.compile(r"[^\w\s]|_")  # Neither alphanumeric nor whitespace
+
+# ASCII strings longer than this are scanned with NumPy byte views
+NUMPY_SCAN_MIN_LENGTH = 1024
+
+# Distinct short strings whose stats are remembered; repeats (greetings,
+# canned queries) skip the scan entirely
+TEXT_STATS_CACHE_SIZE = 512
+
+
+@lru_cache(maxsize=None)
+def _ascii_tables():
+    """Per-byte lookup tables (is_digit, is_space, is_special) for ASCII."""
+    import numpy as np
+    chars = [chr(b) for b in range(128)]
+    return (
+        np.array([c.isdigit() for c in chars]),
+        np.array([c.isspace() for c in chars]),
+        np.array([not c.isalnum() and not c.isspace() for c in chars]),
+    )
+
+
+def _ascii_text_stats(text: str) -> Dict[str, Any]:
+    """Vectorized word count and character checks for a non-empty ASCII string."""
+    import numpy as np
+    is_digit, is_space, is_special = _ascii_tables()
+    codes = np.frombuffer(text.encode("ascii"), dtype=np.uint8)
+    space = is_space[codes]
+    # A word starts at each non-space byte that follows a space (or the start)
+    word_count = int(np.count_nonzero(space[:-1] & ~space[1:])) + int(not space[0])
+    return {
+        "word_count": word_count,
+        "has_numbers": bool(is_digit[codes].any()),
+        "has_special_chars": bool(is_special[codes].any()),
+    }
+
+
+def _has_digit(text: str) -> bool:
+    """Same answer as any(c.isdigit() for c in text)."""
+    if _DIGIT_RE.search(text):
+        return True
+    # str.isdigit() also accepts non-decimal digits such as "²" and "①",
+    # which \d does not match; only non-ASCII text can contain them
+    return not text.isascii() and any(c.isdigit() for c in text)
+
+
+@lru_cache(maxsize=TEXT_STATS_CACHE_SIZE)
+def _short_text_stats(text: str) -> Tuple[int, bool, bool]:
+    """(word_count, has_numbers, has_special_chars) for a short string."""
+    return (
+        len(text.split()),
+        _has_digit(text),
+        bool(_SPECIAL_RE.search(text)),
+    )
 
 
 class SimpleAssistantAgent(BaseAgent):
@@ -14,16 +73,61 @@ class SimpleAssistantAgent(BaseAgent):
     - TaskPacket creation
     """
     
-    def __init__(self, model_type: str = "fast"):
+    __slots__ = ("model_type", "llm_factory", "llm")
+    
+    # Built once per class; get_tools() only copies the references
+    _TOOLS: Final[Tuple[AgentTool, ...]] = (
+        AgentTool(
+            name="generate_text",
+            description="Generate text using an LLM",
+            parameters={
+                "type": "object",
+                "properties": {
+                    "prompt": {
+                        "type": "string",
+                        "description": "The prompt to send to the LLM"
+                    },
+                    "temperature": {
+                        "type": "number",
+                        "description": "Sampling temperature (0-2)",
+                        "default": 0.7
+                    }
+                },
+                "required": ["prompt"]
+            }
+        ),
+        AgentTool(
+            name="summarize",
+            description="Summarize text content",
+            parameters={
+                "type": "object",
+                "properties": {
+                    "text": {
+                        "type": "string",
+                        "description": "Text to summarize"
+                    },
+                    "max_length": {
+                        "type": "integer",
+                        "description": "Maximum length of summary",
+                        "default": 100
+                    }
+                },
+                "required": ["text"]
+            }
+        ),
+    )
+    
+    def __init__(self, model_type: str = "fast", history_max: Optional[int] = None):
         """
         Initialize the assistant agent.
         
         Args:
             model_type: Type of model to use ('fast' or 'reasoning')
+            history_max: Packets to keep in the conversation history
         """
-        super().__init__()
+        super().__init__(history_max)
         self.model_type = model_type
-        self.llm_factory = LLMFactory()
+        self.llm_factory = get_llm_factory()
         self.llm = self.llm_factory.get_model(model_type)
     
     @property
@@ -84,46 +188,7 @@ class SimpleAssistantAgent(BaseAgent):
         Returns:
             List of AgentTool definitions
         """
-        return [
-            AgentTool(
-                name="generate_text",
-                description="Generate text using an LLM",
-                parameters={
-                    "type": "object",
-                    "properties": {
-                        "prompt": {
-                            "type": "string",
-                            "description": "The prompt to send to the LLM"
-                        },
-                        "temperature": {
-                            "type": "number",
-                            "description": "Sampling temperature (0-2)",
-                            "default": 0.7
-                        }
-                    },
-                    "required": ["prompt"]
-                }
-            ),
-            AgentTool(
-                name="summarize",
-                description="Summarize text content",
-                parameters={
-                    "type": "object",
-                    "properties": {
-                        "text": {
-                            "type": "string",
-                            "description": "Text to summarize"
-                        },
-                        "max_length": {
-                            "type": "integer",
-                            "description": "Maximum length of summary",
-                            "default": 100
-                        }
-                    },
-                    "required": ["text"]
-                }
-            )
-        ]
+        return list(self._TOOLS)
 
 
 class AnalyzerAgent(BaseAgent):
@@ -133,8 +198,41 @@ class AnalyzerAgent(BaseAgent):
     Demonstrates a pure Python agent implementation.
     """
     
-    def __init__(self):
-        super().__init__()
+    __slots__ = ("analysis_count",)
+    
+    # Built once per class; get_tools() only copies the references
+    _TOOLS: Final[Tuple[AgentTool, ...]] = (
+        AgentTool(
+            name="analyze_text",
+            description="Analyze text and return statistics",
+            parameters={
+                "type": "object",
+                "properties": {
+                    "text": {
+                        "type": "string",
+                        "description": "Text to analyze"
+                    }
+                },
+                "required": ["text"]
+            }
+        ),
+        AgentTool(
+            name="analyze_structure",
+            description="Analyze data structure (dict, list, etc.)",
+            parameters={
+                "type": "object",
+                "properties": {
+                    "data": {
+                        "description": "Data structure to analyze"
+                    }
+                },
+                "required": ["data"]
+            }
+        ),
+    )
+    
+    def __init__(self, history_max: Optional[int] = None):
+        super().__init__(history_max)
         self.analysis_count = 0
     
     @property
@@ -161,12 +259,27 @@ class AnalyzerAgent(BaseAgent):
         
         # Perform different analysis based on input type
         if isinstance(input_data, str):
+            if len(input_data) <= NUMPY_SCAN_MIN_LENGTH:
+                word_count, has_numbers, has_special = _short_text_stats(input_data)
+                stats = {
+                    "word_count": word_count,
+                    "has_numbers": has_numbers,
+                    "has_special_chars": has_special
+                }
+            elif input_data.isascii():
+                stats = _ascii_text_stats(input_data)
+            else:
+                stats = {
+                    "word_count": len(input_data.split()),
+                    "has_numbers": _has_digit(input_data),
+                    "has_special_chars": bool(_SPECIAL_RE.search(input_data))
+                }
             analysis.update({
                 "length": len(input_data),
-                "word_count": len(input_data.split()),
+                "word_count": stats["word_count"],
                 "char_count": len(input_data),
-                "has_numbers": any(c.isdigit() for c in input_data),
-                "has_special_chars": any(not c.isalnum() and not c.isspace() for c in input_data)
+                "has_numbers": stats["has_numbers"],
+                "has_special_chars": stats["has_special_chars"]
             })
         elif isinstance(input_data, dict):
             analysis.update({
@@ -195,32 +308,4 @@ class AnalyzerAgent(BaseAgent):
         Returns:
             List of AgentTool definitions
         """
-        return [
-            AgentTool(
-                name="analyze_text",
-                description="Analyze text and return statistics",
-                parameters={
-                    "type": "object",
-                    "properties": {
-                        "text": {
-                            "type": "string",
-                            "description": "Text to analyze"
-                        }
-                    },
-                    "required": ["text"]
-                }
-            ),
-            AgentTool(
-                name="analyze_structure",
-                description="Analyze data structure (dict, list, etc.)",
-                parameters={
-                    "type": "object",
-                    "properties": {
-                        "data": {
-                            "description": "Data structure to analyze"
-                        }
-                    },
-                    "required": ["data"]
-                }
-            )
-        ]
+        return list(self._TOOLS)
@@ -0,0 +1,135 @@
+"""
+LLM Response Cache — skips repeat LLM calls for identical or near-identical prompts.
+
+Two layers:
+- Exact: SHA256 of model + system prompt + user prompt in a TTL cache.
+- Approximate: the user prompt embedding is bucketed with random-projection
+  LSH; candidates sharing a bucket are verified with cosine similarity on
+  stored FP16 vectors before their cached response is reused.
+
+Near-hits are off by default (LLM_CACHE_NEAR_HITS) and, when on, only used
+for agents listed in NEAR_HIT_NAMESPACES. Extraction agents stay exact-match:
+templated bank emails that differ only in amount or merchant embed almost
+identically, and a near-hit would hand back another email's figures.
+Near-hits are matched within a namespace that includes the full system
+prompt, so per-email RAG context is never crossed either.
+"""
+
+import os
+import hashlib
+import logging
+import threading
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1024"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "3600"))
+LLM_CACHE_THRESHOLD = float(os.getenv("LLM_CACHE_THRESHOLD", "0.95"))
+LLM_CACHE_NEAR_HITS = os.getenv("LLM_CACHE_NEAR_HITS", "false").lower() == "true"
+
+# Agents whose answers may be reused for a near-identical prompt
+NEAR_HIT_NAMESPACES = frozenset({"email"})
+
+# LSH layout: several small tables keep recall high at a 0.95 cosine threshold
+LSH_TABLES = 4
+LSH_BITS = 8
+# Cap per bucket so stale entries cannot grow without bound
+LSH_BUCKET_SIZE = 8
+
+
+def prompt_key(model: str, system_prompt: str, user_prompt: str) -> str:
+    """Exact-match cache key for a prompt."""
+    return hashlib.sha256((model + system_prompt + user_prompt).encode()).hexdigest()
+
+
+class SemanticCache:
+    """Exact + LSH near-duplicate cache for LLM responses."""
+
+    def __init__(self, maxsize: int = LLM_CACHE_SIZE, ttl: int = LLM_CACHE_TTL,
+                 threshold: float = LLM_CACHE_THRESHOLD, dim: int = 384, seed: int = 0):
+        self.threshold = threshold
+        self._exact: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._planes = np.random.default_rng(seed).standard_normal(
+            (LSH_TABLES, LSH_BITS, dim)
+        ).astype(np.float32)
+        self._weights = (1 << np.arange(LSH_BITS)).astype(np.int64)
+        # (namespace, table, bucket) -> [(fp16 vector, exact key)]
+        self._buckets: Dict[Tuple[str, int, int], List[Tuple[np.ndarray, str]]] = {}
+        self._lock = threading.Lock()
+
+    def _signatures(self, vec: np.ndarray) -> List[int]:
+        """One bucket id per LSH table."""
+        bits = (self._planes @ vec) > 0
+        return (bits @ self._weights).tolist()
+
+    def get(self, key: str, vec: Optional[np.ndarray] = None, namespace: str = "",
+            threshold: Optional[float] = None) -> Optional[str]:
+        """Return a cached response for an exact key or a near-identical vector."""
+        threshold = self.threshold if threshold is None else threshold
+        with self._lock:
+            hit = self._exact.get(key)
+            if hit is not None or vec is None:
+                return hit
+
+            best_key, best_score = None, threshold
+            for table, bucket in enumerate(self._signatures(vec)):
+                entries = self._buckets.get((namespace, table, bucket))
+                if not entries:
+                    continue
+                # Drop entries whose response has expired from the exact layer
+                entries[:] = [e for e in entries if e[1] in self._exact]
+                for stored, stored_key in entries:
+                    score = float(stored.astype(np.float32) @ vec)
+                    if score >= best_score:
+                        best_key, best_score = stored_key, score
+
+            if best_key is None:
+                return None
+            logger.debug(f"LLM cache near-hit (cosine={best_score:.3f})")
+            return self._exact.get(best_key)
+
+    def set(self, key: str, value: str, vec: Optional[np.ndarray] = None, namespace: str = ""):
+        """Store a response under its exact key and, if given, its vector."""
+        with self._lock:
+            self._exact[key] = value
+            if vec is None:
+                return
+            stored = vec.astype(np.float16)
+            for table, bucket in enumerate(self._signatures(vec)):
+                entries = self._buckets.setdefault((namespace, table, bucket), [])
+                entries.append((stored, key))
+                if len(entries) > LSH_BUCKET_SIZE:
+                    del entries[0]
+
+    def clear(self):
+        with self._lock:
+            self._exact.clear()
+            self._buckets.clear()
+
+
+def embed_prompt(text: str) -> np.ndarray:
+    """Unit-length embedding of a prompt, reusing the RAG embedder."""
+    from app.services.rag_service import _embed_text
+
+    vec = np.asarray(_embed_text(text), dtype=np.float32)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+# Singleton
+_llm_cache: Optional[SemanticCache] = None
+
+
+def get_llm_cache() -> Optional[SemanticCache]:
+    """Get or create the LLM cache singleton. Returns None when disabled."""
+    global _llm_cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    if _llm_cache is None:
+        _llm_cache = SemanticCache()
+    return _llm_cache
@@ -6,14 +6,19 @@ with proper configuration from environment settings.
 """
 
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Optional
-from langchain_google_genai import ChatGoogleGenerativeAI
+from functools import lru_cache
+from typing import Any, Dict, Optional, TYPE_CHECKING
 from app.core.config import get_settings
 
+if TYPE_CHECKING:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
 
 class LLMProvider(ABC):
     """Abstract base class for LLM providers."""
     
+    __slots__ = ()
+    
     @abstractmethod
     def generate(self, prompt: str, **kwargs) -> str:
         """Generate a response from the LLM."""
@@ -28,7 +33,11 @@ class LLMProvider(ABC):
 class GoogleAIProvider(LLMProvider):
     """Google AI implementation of LLM provider using LangChain."""
     
+    __slots__ = ("model", "client")
+    
     def __init__(self, model: str, api_key: str):
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
         self.model = model
         self.client = ChatGoogleGenerativeAI(
             model=model,
@@ -72,6 +81,10 @@ class LLMFactory:
             # "ollama": OllamaProvider,
         }
         
+        # Provider instances per model type; clients are expensive to build
+        # and hold connection pools, so they are reused
+        self._instances: Dict[str, LLMProvider] = {}
+        
         # Model type to configuration mapping
         self._model_configs = {
             "fast": {
@@ -88,6 +101,8 @@ class LLMFactory:
         """
         Get an LLM provider instance based on model type.
         
+        Instances are created once per model type and cached.
+        
         Args:
             model_type: Type of model ('fast' or 'reasoning')
         
@@ -97,6 +112,9 @@ class LLMFactory:
         Raises:
             ValueError: If model_type is not recognized
         """
+        if model_type in self._instances:
+            return self._instances[model_type]
+        
         if model_type not in self._model_configs:
             raise ValueError(
                 f"Unknown model type: {model_type}. "
@@ -108,10 +126,12 @@ class LLMFactory:
         
         # Instantiate provider with appropriate credentials
         if config["provider"] == "google":
-            return provider_class(
+            instance = provider_class(
                 model=config["model"],
                 api_key=self.settings.google_api_key
             )
+            self._instances[model_type] = instance
+            return instance
         
         # Future provider instantiation logic can be added here
         raise NotImplementedError(f"Provider {config['provider']} not implemented")
@@ -125,6 +145,11 @@ class LLMFactory:
             provider_class: Provider class implementing LLMProvider
         """
         self._providers[name] = provider_class
+        
+        # Drop cached instances built from a previous registration
+        for model_type, config in self._model_configs.items():
+            if config["provider"] == name:
+                self._instances.pop(model_type, None)
     
     def configure_model(self, model_type: str, provider: str, model: str):
         """
@@ -139,6 +164,13 @@ class LLMFactory:
             "provider": provider,
             "model": model,
         }
+        self._instances.pop(model_type, None)
+
+
+@lru_cache()
+def get_llm_factory() -> LLMFactory:
+    """Get the shared LLM factory, so provider clients are built once per process."""
+    return LLMFactory()
 
 
 # Helper functions for LangChain integration
@@ -146,7 +178,7 @@ def create_llm(
     model: Optional[str] = None,
     temperature: float = 0.7,
     **kwargs
-) -> ChatGoogleGenerativeAI:
+) -> "ChatGoogleGenerativeAI":
     """
     Create a Google Gemini LLM instance with configuration from settings.
     
@@ -162,6 +194,8 @@ def create_llm(
         >>> llm = create_llm()
         >>> llm = create_llm(model="gemini-1.5-pro", temperature=0.5)
     """
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
     settings = get_settings()
     
     # Use provided model or default to fast_model from settings
@@ -179,7 +213,7 @@ def create_llm(
 def create_reasoning_llm(
     temperature: float = 0.3,
     **kwargs
-) -> ChatGoogleGenerativeAI:
+) -> "ChatGoogleGenerativeAI":
     """
     Create a Google Gemini LLM instance optimized for reasoning tasks.
     
@@ -197,6 +231,8 @@ def create_reasoning_llm(
         >>> reasoning_llm = create_reasoning_llm()
         >>> reasoning_llm = create_reasoning_llm(temperature=0.1)
     """
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
     settings = get_settings()
     
     return ChatGoogleGenerativeAI(
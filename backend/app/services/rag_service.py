@@ -9,20 +9,53 @@ Uses sentence-transformers for local embedding generation.
 Falls back to TF-IDF hashing when sentence-transformers is unavailable.
 """
 
+import os
+import re
+import time
 import logging
+import queue
+import hashlib
+import threading
 import numpy as np
-from typing import List, Dict, Optional, Any
+import orjson
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import Future
+from typing import List, Dict, Optional, Any, Iterator, Tuple
 
+from cachetools import LRUCache
 from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 
 from app.database import engine, SessionLocal
+from app.models import PGVECTOR_AVAILABLE
+
+if PGVECTOR_AVAILABLE:
+    from app.models import EmailEmbedding, CorrectionEmbedding
 
 logger = logging.getLogger(__name__)
 
 # Embedding dimension
 EMBEDDING_DIM = 384
 
+# HNSW query-time candidate list size (recall vs latency); the indexes
+# themselves are built by init_db
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "100"))
+
+# Near-duplicate emails (newsletter bursts, auto-replies) reuse a recent context
+CONTEXT_CACHE_SIZE = int(os.getenv("RAG_CONTEXT_CACHE_SIZE", "512"))
+CONTEXT_CACHE_TTL = float(os.getenv("RAG_CONTEXT_CACHE_TTL", "300"))
+CONTEXT_CACHE_THRESHOLD = float(os.getenv("RAG_CONTEXT_CACHE_THRESHOLD", "0.95"))
+
+# Concurrent single-text embeddings are merged into one encoder call
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "32"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+
+# Stored content re-indexed by retries/re-analysis is embedded only once
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "4096"))
+
 
 # ------------------------------------------------------------------
 # Embedding generation
@@ -45,40 +78,292 @@ def _get_embedder():
     return _embedder
 
 
-def _embed_text(text: str) -> List[float]:
-    """Generate an embedding vector for the given text."""
+def _embed_text(text: str) -> np.ndarray:
+    """Generate a float32 embedding vector for the given text."""
+    embedder = _get_embedder()
+
+    if embedder == "fallback":
+        # Deterministic hash-based fallback (not great quality, but functional):
+        # one SHAKE digest byte per dimension, L2-normalized like the model output
+        digest = hashlib.shake_128(text.encode()).digest(EMBEDDING_DIM)
+        vec = (np.frombuffer(digest, dtype=np.uint8).astype(np.float32) - 128.0) * (1.0 / 128.0)
+        vec /= np.linalg.norm(vec) + 1e-12
+        return vec
+
+    return _get_embed_batcher().submit(text[:2000]).result()
+
+
+class _EmbedBatcher:
+    """
+    Micro-batcher for single-text embeddings.
+
+    Callers enqueue a text and wait on a Future; one worker thread drains up
+    to EMBED_MAX_BATCH texts (waiting at most EMBED_MAX_WAIT_MS for more to
+    arrive) and encodes them in one forward pass.
+    """
+
+    def __init__(self, embedder, max_batch: int = EMBED_MAX_BATCH, max_wait_ms: float = EMBED_MAX_WAIT_MS):
+        self._embedder = embedder
+        self._max_batch = max_batch
+        self._max_wait = max_wait_ms / 1000
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, text: str) -> Future:
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self._max_wait
+            while len(batch) < self._max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            texts = [text for text, _ in batch]
+            try:
+                embeddings = self._embedder.encode(
+                    texts, batch_size=self._max_batch,
+                    normalize_embeddings=True, convert_to_numpy=True,
+                )
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+
+
+_embed_batcher: Optional[_EmbedBatcher] = None
+_embed_batcher_lock = threading.Lock()
+
+
+def _get_embed_batcher() -> _EmbedBatcher:
+    """Get or start the embedding micro-batcher."""
+    global _embed_batcher
+    if _embed_batcher is None:
+        with _embed_batcher_lock:
+            if _embed_batcher is None:
+                _embed_batcher = _EmbedBatcher(_get_embedder())
+    return _embed_batcher
+
+
+_embedding_cache: LRUCache = LRUCache(maxsize=EMBED_CACHE_SIZE)
+_embedding_cache_lock = threading.Lock()
+
+
+def _content_key(content: str) -> bytes:
+    return hashlib.blake2b(content.encode(), digest_size=16).digest()
+
+
+def _embed_text_cached(content: str) -> np.ndarray:
+    """
+    _embed_text memoized by content hash, for stored documents.
+
+    Query embeddings don't go through here; query texts rarely repeat.
+    The returned array is shared and read-only.
+    """
+    key = _content_key(content)
+    with _embedding_cache_lock:
+        embedding = _embedding_cache.get(key)
+    if embedding is not None:
+        return embedding
+
+    embedding = _embed_text(content)
+    embedding.setflags(write=False)
+    with _embedding_cache_lock:
+        _embedding_cache[key] = embedding
+    return embedding
+
+
+def _embed_texts(texts: List[str]) -> List[np.ndarray]:
+    """Generate embeddings for several texts in one encoder call."""
     embedder = _get_embedder()
 
     if embedder == "fallback":
-        # Deterministic hash-based fallback (not great quality, but functional)
-        from hashlib import sha256
-        h = sha256(text.encode()).hexdigest()
-        # Convert hex to floats
-        vec = []
-        for i in range(0, min(len(h), EMBEDDING_DIM * 2), 2):
-            vec.append((int(h[i:i+2], 16) - 128) / 128.0)
-        # Pad to EMBEDDING_DIM
-        while len(vec) < EMBEDDING_DIM:
-            vec.append(0.0)
-        return vec[:EMBEDDING_DIM]
-
-    embedding = embedder.encode(text[:2000], normalize_embeddings=True)
-    return embedding.tolist()
+        return [_embed_text(t) for t in texts]
+
+    embeddings = embedder.encode(
+        [t[:2000] for t in texts], batch_size=32, normalize_embeddings=True
+    )
+    return list(embeddings)
+
+
+def _embed_texts_cached(contents: List[str]) -> List[np.ndarray]:
+    """Batch version of _embed_text_cached; misses are embedded in one encoder call."""
+    keys = [_content_key(content) for content in contents]
+    with _embedding_cache_lock:
+        embeddings = [_embedding_cache.get(key) for key in keys]
+
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        fetched = _embed_texts([contents[i] for i in missing])
+        with _embedding_cache_lock:
+            for i, embedding in zip(missing, fetched):
+                embedding.setflags(write=False)
+                _embedding_cache[keys[i]] = embeddings[i] = embedding
+    return embeddings
+
+
+def _vec_literal(embedding: np.ndarray) -> str:
+    """pgvector text literal, formatted in one orjson call instead of per-float str()."""
+    return orjson.dumps(embedding, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+
+_LEADING_INT_RE = re.compile(r"\s*(-?\d+)")
+
+
+def _urgency_score(value: Any) -> int:
+    """LLM urgency as an int: 7, "7" and "7/10" give 7; anything unparsable gives 0."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        match = _LEADING_INT_RE.match(str(value))
+        return int(match.group(1)) if match else 0
 
 
 # ------------------------------------------------------------------
 # pgvector extension & table setup
 # ------------------------------------------------------------------
 
+_bootstrapped = False
+_bootstrap_lock = threading.Lock()
+
+
 def ensure_pgvector_extension():
-    """Create the pgvector extension if it doesn't exist."""
-    try:
-        with engine.connect() as conn:
-            conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
-            conn.commit()
-            logger.info("pgvector extension enabled")
-    except Exception as e:
-        logger.warning(f"Could not enable pgvector extension: {e}")
+    """Create the pgvector extension, once per process."""
+    global _bootstrapped
+    with _bootstrap_lock:
+        if _bootstrapped:
+            return
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+                conn.commit()
+                logger.info("pgvector extension enabled")
+        except Exception as e:
+            logger.warning(f"Could not enable pgvector extension: {e}")
+            return
+        _bootstrapped = True
+
+
+_SET_EF_SEARCH_SQL = text(f"SET LOCAL hnsw.ef_search = {HNSW_EF_SEARCH}")
+
+
+def _set_ef_search(conn: Connection) -> None:
+    """Set the HNSW search breadth for the current transaction only."""
+    conn.execute(_SET_EF_SEARCH_SQL)
+
+
+# ANN queries, built once with and without the user filter so each call
+# reuses the same statement object (and SQLAlchemy's compiled form of it)
+def _ann_sql(columns: str, table: str, user_filter: bool):
+    return text(f"""
+        SELECT {columns},
+               embedding <=> CAST(:vec AS halfvec) AS distance
+        FROM {table}
+        {"WHERE user_id = :user_id" if user_filter else ""}
+        ORDER BY distance ASC
+        LIMIT :limit
+    """)
+
+
+_EMAIL_COLUMNS = "email_id, content, category, urgency_score, summary"
+_CORRECTION_COLUMNS = "email_id, field, old_value, new_value, content"
+_EMAIL_SQL_USER = _ann_sql(_EMAIL_COLUMNS, "email_embeddings", user_filter=True)
+_EMAIL_SQL_NOUSER = _ann_sql(_EMAIL_COLUMNS, "email_embeddings", user_filter=False)
+_CORRECTION_SQL_USER = _ann_sql(_CORRECTION_COLUMNS, "correction_embeddings", user_filter=True)
+_CORRECTION_SQL_NOUSER = _ann_sql(_CORRECTION_COLUMNS, "correction_embeddings", user_filter=False)
+
+
+# ------------------------------------------------------------------
+# Semantic context cache
+# ------------------------------------------------------------------
+
+class SemanticContextCache:
+    """
+    Context strings keyed by query embedding, matched by cosine similarity.
+
+    Keys live in one preallocated (max_size, dim) matrix so a lookup is a
+    single matrix-vector product. Rows are recycled least-recently-used
+    first; expired rows are ignored until they are overwritten.
+    """
+
+    def __init__(
+        self,
+        max_size: int = CONTEXT_CACHE_SIZE,
+        ttl_seconds: float = CONTEXT_CACHE_TTL,
+        threshold: float = CONTEXT_CACHE_THRESHOLD,
+        dim: int = EMBEDDING_DIM,
+    ):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self._keys = np.zeros((max_size, dim), dtype=np.float32)
+        self._users = np.zeros(max_size, dtype=np.int64)
+        self._expires_at = np.zeros(max_size, dtype=np.float64)
+        self._values: List[Optional[str]] = [None] * max_size
+        self._lru: "OrderedDict[int, None]" = OrderedDict()  # row -> None, oldest first
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _normalize(vec: np.ndarray) -> np.ndarray:
+        vec = np.asarray(vec, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    @staticmethod
+    def _user_key(user_id: Optional[int]) -> int:
+        return -1 if user_id is None else user_id
+
+    def get(self, vec: np.ndarray, user_id: Optional[int] = None) -> Optional[str]:
+        """Cached context for the most similar live entry of this user, if close enough."""
+        with self._lock:
+            n = len(self._lru)
+            if not n:
+                return None
+            sims = self._keys[:n] @ self._normalize(vec)
+            sims[
+                (self._users[:n] != self._user_key(user_id))
+                | (self._expires_at[:n] <= time.monotonic())
+            ] = -np.inf
+            idx = int(sims.argmax())
+            if sims[idx] < self.threshold:
+                return None
+            self._lru.move_to_end(idx)
+            return self._values[idx]
+
+    def set(self, vec: np.ndarray, user_id: Optional[int], value: str) -> None:
+        """Store a context string, overwriting the least recently used row when full."""
+        with self._lock:
+            if len(self._lru) < self.max_size:
+                row = len(self._lru)
+            else:
+                row, _ = self._lru.popitem(last=False)
+            self._keys[row] = self._normalize(vec)
+            self._users[row] = self._user_key(user_id)
+            self._expires_at[row] = time.monotonic() + self.ttl_seconds
+            self._values[row] = value
+            self._lru[row] = None
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+            self._values = [None] * self.max_size
+
+    def invalidate(self, user_id: Optional[int] = None) -> None:
+        """Expire every entry of one user, e.g. after they add a correction."""
+        with self._lock:
+            n = len(self._lru)
+            self._expires_at[:n][self._users[:n] == self._user_key(user_id)] = 0.0
 
 
 # ------------------------------------------------------------------
@@ -90,10 +375,25 @@ class RAGService:
 
     def __init__(self):
         ensure_pgvector_extension()
+        self._context_cache = SemanticContextCache()
         logger.info("RAG service initialized with pgvector")
 
-    def _get_session(self) -> Session:
-        return SessionLocal()
+    @contextmanager
+    def _get_session(self) -> Iterator[Session]:
+        """Session in one transaction: committed on exit, rolled back on error."""
+        with SessionLocal.begin() as db:
+            yield db
+
+    @contextmanager
+    def _read_connection(self) -> Iterator[Connection]:
+        """
+        Plain pooled connection for read-only queries, skipping the ORM session.
+
+        Not autocommit: SET LOCAL hnsw.ef_search needs a transaction, which is
+        rolled back when the connection returns to the pool.
+        """
+        with engine.connect() as conn:
+            yield conn
 
     # ------------------------------------------------------------------
     # Store
@@ -107,49 +407,60 @@ class RAGService:
         user_id: Optional[int] = None,
     ) -> None:
         """Store a processed email as a vector embedding."""
-        db = self._get_session()
+        self.store_email_contexts([(email_id, text_content, analysis, user_id)])
+
+    def store_email_contexts(
+        self,
+        items: List[Tuple[int, str, Dict[str, Any], Optional[int]]],
+    ) -> None:
+        """
+        Store several processed emails in one transaction.
+
+        items are (email_id, text_content, analysis, user_id) tuples. Texts
+        are embedded in one encoder call and written with a single
+        INSERT ... ON CONFLICT (email_id) DO UPDATE.
+        """
+        if not items:
+            return
+
+        if not PGVECTOR_AVAILABLE:
+            logger.debug("pgvector not available, skipping store")
+            return
+
+        # One row per email; the statement cannot touch the same row twice
+        latest = {email_id: (text_content, analysis, user_id)
+                  for email_id, text_content, analysis, user_id in items}
+        contents = [text_content[:2000] for text_content, _, _ in latest.values()]
+
         try:
-            from app.models import PGVECTOR_AVAILABLE
-            if not PGVECTOR_AVAILABLE:
-                logger.debug("pgvector not available, skipping store")
-                return
-
-            from app.models import EmailEmbedding
-
-            content = text_content[:2000]
-            embedding = _embed_text(content)
-
-            # Upsert — delete existing then insert
-            existing = db.query(EmailEmbedding).filter(
-                EmailEmbedding.email_id == email_id
-            ).first()
-
-            if existing:
-                existing.content = content
-                existing.category = str(analysis.get("category", ""))
-                existing.urgency_score = int(analysis.get("urgency_score", 0))
-                existing.summary = str(analysis.get("summary", ""))[:500]
-                existing.embedding = embedding
-                existing.user_id = user_id
-            else:
-                record = EmailEmbedding(
+            embeddings = _embed_texts_cached(contents)
+            rows = [
+                dict(
                     user_id=user_id,
                     email_id=email_id,
                     content=content,
                     category=str(analysis.get("category", "")),
-                    urgency_score=int(analysis.get("urgency_score", 0)),
+                    urgency_score=_urgency_score(analysis.get("urgency_score", 0)),
                     summary=str(analysis.get("summary", ""))[:500],
                     embedding=embedding,
                 )
-                db.add(record)
+                for (email_id, (_, analysis, user_id)), content, embedding
+                in zip(latest.items(), contents, embeddings)
+            ]
 
-            db.commit()
-            logger.debug(f"Stored email embedding for email_id={email_id}")
+            stmt = insert(EmailEmbedding).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[EmailEmbedding.email_id],
+                set_={
+                    col: stmt.excluded[col]
+                    for col in ("user_id", "content", "category", "urgency_score", "summary", "embedding")
+                },
+            )
+            with self._get_session() as db:
+                db.execute(stmt)
+            logger.debug(f"Stored {len(rows)} email embeddings")
         except Exception as e:
-            db.rollback()
-            logger.error(f"Failed to store email embedding: {e}")
-        finally:
-            db.close()
+            logger.error(f"Failed to store email embeddings: {e}")
 
     def store_correction(
         self,
@@ -161,19 +472,15 @@ class RAGService:
         user_id: Optional[int] = None,
     ) -> None:
         """Store a user correction as a vector embedding."""
-        db = self._get_session()
-        try:
-            from app.models import PGVECTOR_AVAILABLE
-            if not PGVECTOR_AVAILABLE:
-                return
-
-            from app.models import CorrectionEmbedding
+        if not PGVECTOR_AVAILABLE:
+            return
 
+        try:
             content = (
                 f"Correction for email: {email_text[:1000]}\n"
                 f"Field '{field}' was '{old_value}' → corrected to '{new_value}'"
             )
-            embedding = _embed_text(content)
+            embedding = _embed_text_cached(content)
 
             record = CorrectionEmbedding(
                 user_id=user_id,
@@ -184,14 +491,13 @@ class RAGService:
                 content=content,
                 embedding=embedding,
             )
-            db.add(record)
-            db.commit()
+            with self._get_session() as db:
+                db.add(record)
+            # Cached contexts predate the correction
+            self._context_cache.invalidate(user_id)
             logger.debug(f"Stored correction embedding for email_id={email_id}")
         except Exception as e:
-            db.rollback()
             logger.error(f"Failed to store correction embedding: {e}")
-        finally:
-            db.close()
 
     # ------------------------------------------------------------------
     # Retrieve
@@ -204,54 +510,12 @@ class RAGService:
         top_k: int = 3,
     ) -> List[Dict[str, Any]]:
         """Find top-K similar past emails using cosine distance."""
-        db = self._get_session()
         try:
-            from app.models import PGVECTOR_AVAILABLE
-            if not PGVECTOR_AVAILABLE:
-                return []
-
-            from app.models import EmailEmbedding
-
-            query_embedding = _embed_text(text_content[:2000])
-            vec_str = "[" + ",".join(str(v) for v in query_embedding) + "]"
-
-            # Build query with optional user filter
-            user_filter = ""
-            params = {"vec": vec_str, "limit": top_k}
-            if user_id is not None:
-                user_filter = "AND user_id = :user_id"
-                params["user_id"] = user_id
-
-            sql = text(f"""
-                SELECT email_id, content, category, urgency_score, summary,
-                       embedding <=> :vec::vector AS distance
-                FROM email_embeddings
-                WHERE 1=1 {user_filter}
-                ORDER BY distance ASC
-                LIMIT :limit
-            """)
-
-            result = db.execute(sql, params)
-            rows = result.fetchall()
-
-            return [
-                {
-                    "email_id": row[0],
-                    "document": row[1],
-                    "metadata": {
-                        "category": row[2],
-                        "urgency_score": row[3],
-                        "summary": row[4],
-                    },
-                    "distance": float(row[5]),
-                }
-                for row in rows
-            ]
+            similar, _ = self._retrieve_context(text_content, user_id, k_sim=top_k, k_corr=0)
+            return similar
         except Exception as e:
             logger.error(f"RAG retrieval failed: {e}")
             return []
-        finally:
-            db.close()
 
     def retrieve_corrections(
         self,
@@ -260,51 +524,144 @@ class RAGService:
         top_k: int = 3,
     ) -> List[Dict[str, Any]]:
         """Find relevant past corrections using cosine distance."""
-        db = self._get_session()
         try:
-            from app.models import PGVECTOR_AVAILABLE
-            if not PGVECTOR_AVAILABLE:
-                return []
-
-            query_embedding = _embed_text(text_content[:2000])
-            vec_str = "[" + ",".join(str(v) for v in query_embedding) + "]"
-
-            user_filter = ""
-            params = {"vec": vec_str, "limit": top_k}
-            if user_id is not None:
-                user_filter = "AND user_id = :user_id"
-                params["user_id"] = user_id
-
-            sql = text(f"""
-                SELECT email_id, field, old_value, new_value, content,
-                       embedding <=> :vec::vector AS distance
-                FROM correction_embeddings
-                WHERE 1=1 {user_filter}
-                ORDER BY distance ASC
-                LIMIT :limit
-            """)
-
-            result = db.execute(sql, params)
-            rows = result.fetchall()
-
-            return [
-                {
-                    "document": row[4],
-                    "metadata": {
-                        "email_id": row[0],
-                        "field": row[1],
-                        "old_value": row[2],
-                        "new_value": row[3],
-                    },
-                    "distance": float(row[5]),
-                }
-                for row in rows
-            ]
+            _, corrections = self._retrieve_context(text_content, user_id, k_sim=0, k_corr=top_k)
+            return corrections
         except Exception as e:
             logger.error(f"Correction retrieval failed: {e}")
             return []
-        finally:
-            db.close()
+
+    def _retrieve_context(
+        self,
+        text_content: str,
+        user_id: Optional[int] = None,
+        k_sim: int = 3,
+        k_corr: int = 2,
+        embedding: Optional[np.ndarray] = None,
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Find similar emails and corrections for one text.
+
+        The text is embedded once (or the given embedding is used) and both
+        queries run back-to-back on a single session, so they share one
+        connection checkout and one ef_search setting. A k of 0 skips that
+        query.
+        """
+        if not PGVECTOR_AVAILABLE:
+            return [], []
+
+        if embedding is None:
+            embedding = _embed_text(text_content[:2000])
+        vec_str = _vec_literal(embedding)
+
+        with self._read_connection() as conn:
+            _set_ef_search(conn)
+            similar = self._query_similar(conn, vec_str, user_id, k_sim) if k_sim else []
+            corrections = self._query_corrections(conn, vec_str, user_id, k_corr) if k_corr else []
+            return similar, corrections
+
+    @staticmethod
+    def _query_similar(
+        conn: Connection, vec_str: str, user_id: Optional[int], top_k: int
+    ) -> List[Dict[str, Any]]:
+        params = {"vec": vec_str, "limit": top_k}
+        if user_id is not None:
+            sql = _EMAIL_SQL_USER
+            params["user_id"] = user_id
+        else:
+            sql = _EMAIL_SQL_NOUSER
+
+        # Rows are consumed straight off the cursor; distance is already a float
+        return [
+            {
+                "email_id": email_id,
+                "document": content,
+                "metadata": {
+                    "category": category,
+                    "urgency_score": urgency_score,
+                    "summary": summary,
+                },
+                "distance": distance,
+            }
+            for email_id, content, category, urgency_score, summary, distance
+            in conn.execute(sql, params)
+        ]
+
+    @staticmethod
+    def _query_corrections(
+        conn: Connection, vec_str: str, user_id: Optional[int], top_k: int
+    ) -> List[Dict[str, Any]]:
+        params = {"vec": vec_str, "limit": top_k}
+        if user_id is not None:
+            sql = _CORRECTION_SQL_USER
+            params["user_id"] = user_id
+        else:
+            sql = _CORRECTION_SQL_NOUSER
+
+        return [
+            {
+                "document": content,
+                "metadata": {
+                    "email_id": email_id,
+                    "field": field,
+                    "old_value": old_value,
+                    "new_value": new_value,
+                },
+                "distance": distance,
+            }
+            for email_id, field, old_value, new_value, content, distance
+            in conn.execute(sql, params)
+        ]
+
+    def _retrieve_batch(
+        self,
+        select_sql: str,
+        embeddings: List[np.ndarray],
+        user_id: Optional[int],
+        top_k: int,
+    ) -> List[list]:
+        """
+        Run one top-K nearest-neighbour query for many embeddings at once.
+
+        select_sql selects from a single embedding table aliased as t and
+        may reference the query vector as q.vec. Returns the rows grouped
+        per input embedding, nearest first.
+        """
+        if not embeddings:
+            return []
+
+        if not PGVECTOR_AVAILABLE:
+            return [[] for _ in embeddings]
+
+        params = {"limit": top_k}
+        values = []
+        for i, embedding in enumerate(embeddings):
+            values.append(f"({i}, CAST(:vec{i} AS halfvec))")
+            params[f"vec{i}"] = _vec_literal(embedding)
+
+        user_filter = ""
+        if user_id is not None:
+            user_filter = "AND t.user_id = :user_id"
+            params["user_id"] = user_id
+
+        sql = text(f"""
+            SELECT q.idx, n.*
+            FROM (VALUES {", ".join(values)}) AS q(idx, vec)
+            CROSS JOIN LATERAL (
+                {select_sql}
+                WHERE 1=1 {user_filter}
+                ORDER BY distance ASC
+                LIMIT :limit
+            ) n
+            ORDER BY q.idx, n.distance
+        """)
+
+        grouped: List[list] = [[] for _ in embeddings]
+        with self._read_connection() as conn:
+            _set_ef_search(conn)
+            for row in conn.execute(sql, params):
+                grouped[row[0]].append(row[1:])
+        return grouped
 
     # ------------------------------------------------------------------
     # Context builder
@@ -319,9 +676,74 @@ class RAGService:
         Build a context block to prepend to the LLM system prompt.
         Combines similar emails and corrections into a single string.
         """
-        similar = self.retrieve_similar_emails(text_content, user_id, top_k=3)
-        corrections = self.retrieve_corrections(text_content, user_id, top_k=2)
+        if not PGVECTOR_AVAILABLE:
+            return ""
 
+        try:
+            embedding = _embed_text(text_content[:2000])
+            cached = self._context_cache.get(embedding, user_id)
+            if cached is not None:
+                return cached
+            similar, corrections = self._retrieve_context(
+                text_content, user_id, k_sim=3, k_corr=2, embedding=embedding
+            )
+        except Exception as e:
+            logger.error(f"RAG retrieval failed: {e}")
+            return ""
+
+        context = self._format_context(similar, corrections)
+        self._context_cache.set(embedding, user_id, context)
+        return context
+
+    def build_context_prompts(
+        self,
+        texts: List[str],
+        user_id: Optional[int] = None,
+    ) -> List[str]:
+        """
+        Batch version of build_context_prompt.
+
+        Embeds all texts in one encoder call and issues a single vector
+        query per embedding table for the whole batch.
+        """
+        if not texts:
+            return []
+
+        try:
+            embeddings = _embed_texts(texts)
+            similar_rows = self._retrieve_batch(
+                """SELECT t.email_id, t.content, t.category, t.urgency_score, t.summary,
+                          t.embedding <=> q.vec AS distance
+                   FROM email_embeddings t""",
+                embeddings, user_id, top_k=3,
+            )
+            correction_rows = self._retrieve_batch(
+                """SELECT t.email_id, t.field, t.old_value, t.new_value, t.content,
+                          t.embedding <=> q.vec AS distance
+                   FROM correction_embeddings t""",
+                embeddings, user_id, top_k=2,
+            )
+        except Exception as e:
+            logger.error(f"Batch RAG retrieval failed: {e}")
+            return ["" for _ in texts]
+
+        prompts = []
+        for similar, corrections in zip(similar_rows, correction_rows):
+            prompts.append(self._format_context(
+                [
+                    {"metadata": {"category": r[2], "urgency_score": r[3], "summary": r[4]}}
+                    for r in similar
+                ],
+                [
+                    {"metadata": {"field": r[1], "old_value": r[2], "new_value": r[3]}}
+                    for r in corrections
+                ],
+            ))
+        return prompts
+
+    @staticmethod
+    def _format_context(similar: List[Dict[str, Any]], corrections: List[Dict[str, Any]]) -> str:
+        """Render retrieved emails and corrections as a prompt block."""
         if not similar and not corrections:
             return ""
 
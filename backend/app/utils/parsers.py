@@ -6,19 +6,173 @@ This module contains text parsing functions for extracting structured data.
 
 import re
 import os
-import json
+import hashlib
 import logging
-from litellm import completion
+import threading
+from typing import Literal, Optional
+
+import orjson
+from cachetools import LRUCache
+from pydantic import BaseModel, ConfigDict, field_validator
 
 logger = logging.getLogger(__name__)
 
 # Model configuration
 MODEL = "groq/llama-3.3-70b-versatile"
 
+# Regex fallback patterns, compiled once at import
+_AMOUNT_RE = re.compile(r'rs\.?\s*(\d+[,\d]*)')
+_MERCHANT_RES = tuple(re.compile(p) for p in (
+    r'at\s+([a-z\s]+?)(?:\s+on|\s+for|$)',
+    r'from\s+([a-z\s]+?)(?:\s+on|\s+for|$)',
+    r'to\s+([a-z\s]+?)(?:\s+on|\s+for|$)',
+))
+_ACCOUNT_RES = tuple(re.compile(p) for p in (
+    r'(?:card|a/c|account|ac)\s+(?:no\.?\s*)?(?:xx|ending\s+in\s+)?(\d{4})',
+    r'(\w+\s+(?:credit|debit)\s+card)\s+(?:xx)?(\d{4})',
+    r'(\w+\s+bank)\s+(?:a/c|account)\s+(?:xx)?(\d{4})',
+))
+_LAST4_RE = re.compile(r'(?:xx|ending\s+in\s+|last\s+4\s+digits?\s+)(\d{4})')
+
+_DEBIT_WORDS = frozenset(['debited', 'debit', 'paid', 'payment'])
+# Checked in order; the first category with a matching keyword wins
+_CATEGORY_WORDS = (
+    ("Shopping", frozenset(['shopping', 'amazon', 'flipkart'])),
+    ("Food", frozenset(['food', 'restaurant', 'zomato', 'swiggy'])),
+    ("Transport", frozenset(['uber', 'ola', 'transport', 'taxi'])),
+    ("Bills", frozenset(['bill', 'electricity', 'water', 'gas'])),
+)
+_DEBIT = "debit"
+# LLM spellings of a credit; anything else is read as a debit, the default
+_CREDIT_TYPES = frozenset(['credit', 'credited', 'cr', 'refund', 'deposit', 'received', 'incoming'])
+_DIGITS_RE = re.compile(r'\d+')
+_CATEGORY_RANK = {label: rank for rank, (label, _) in enumerate(_CATEGORY_WORDS)}
+
+
+def _build_keyword_automaton():
+    """
+    All keywords in one Aho-Corasick automaton, so the text is scanned once
+    instead of once per keyword list. None without pyahocorasick.
+    """
+    try:
+        import ahocorasick
+    except ImportError:
+        return None
+
+    automaton = ahocorasick.Automaton()
+    for word in _DEBIT_WORDS:
+        automaton.add_word(word, (_DEBIT,))
+    for label, words in _CATEGORY_WORDS:
+        for word in words:
+            # A word may belong to several classes; keep all its labels
+            automaton.add_word(word, automaton.get(word, ()) + (label,))
+    automaton.make_automaton()
+    return automaton
+
+
+_KEYWORDS = _build_keyword_automaton()
+
+
+def _classify_keywords(text_lower: str) -> tuple:
+    """(is_debit, category) from the keyword lists."""
+    if _KEYWORDS is None:
+        is_debit = any(word in text_lower for word in _DEBIT_WORDS)
+        for label, words in _CATEGORY_WORDS:
+            if any(word in text_lower for word in words):
+                return is_debit, label
+        return is_debit, "Uncategorized"
+
+    is_debit = False
+    best = len(_CATEGORY_WORDS)
+    for _, labels in _KEYWORDS.iter(text_lower):
+        for label in labels:
+            if label == _DEBIT:
+                is_debit = True
+            else:
+                best = min(best, _CATEGORY_RANK[label])
+        if is_debit and best == 0:
+            break
+    category = _CATEGORY_WORDS[best][0] if best < len(_CATEGORY_WORDS) else "Uncategorized"
+    return is_debit, category
+
+
+class TxnLLM(BaseModel):
+    """Transaction fields as returned by the LLM, with their defaults."""
+
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    amount: float = 0.0
+    currency: Optional[str] = "INR"
+    merchant: Optional[str] = "Unknown"
+    category: Optional[str] = "Uncategorized"
+    transaction_type: Literal["debit", "credit"] = "debit"
+    account_name: Optional[str] = None
+    account_last4: Optional[str] = None
+    date: Optional[str] = None
+
+    @field_validator("transaction_type", mode="before")
+    @classmethod
+    def _normalize_type(cls, value):
+        # Models answer "Debit", "withdrawal", "CR", ...; one odd value
+        # shouldn't throw away the rest of the parse
+        if not isinstance(value, str):
+            return _DEBIT
+        value = value.strip().lower()
+        if value in _CREDIT_TYPES:
+            return "credit"
+        return _DEBIT
+
+
+# Bank SMS/emails are templated: messages that differ only in digits
+# (amount, card number, date) share everything else the LLM extracts.
+# Maps digit-masked text hash -> template fields of a previous LLM result.
+TEMPLATE_CACHE_SIZE = 4096
+_template_cache: LRUCache = LRUCache(maxsize=TEMPLATE_CACHE_SIZE)
+_template_cache_lock = threading.Lock()
+_TEMPLATE_FIELDS = ("currency", "merchant", "category", "transaction_type", "account_name")
+
+
+def _template_key(text: str) -> bytes:
+    return hashlib.blake2b(_DIGITS_RE.sub('#', text.lower()).encode(), digest_size=16).digest()
+
+
+def _from_template(template: dict, text_lower: str) -> dict:
+    """Rebuild a full result from cached template fields and this text's digits."""
+    _, account_last4 = _extract_account(text_lower)
+    return {
+        "amount": _extract_amount(text_lower),
+        **template,
+        "account_last4": account_last4,
+        "date": None,
+    }
+
+
+def _cache_template(key: bytes, result: dict, text_lower: str) -> None:
+    """
+    Remember the template fields of an LLM result.
+    
+    Only done when the result can be rebuilt exactly: no digits in the
+    template fields, no date, and the regexes re-extract the same amount
+    and last4 the LLM found.
+    """
+    template = {field: result[field] for field in _TEMPLATE_FIELDS}
+    if result["date"] is not None:
+        return
+    if any(isinstance(v, str) and _DIGITS_RE.search(v) for v in template.values()):
+        return
+    if _from_template(template, text_lower) != result:
+        return
+    with _template_cache_lock:
+        _template_cache[key] = template
+
+
 def parse_transaction_with_llm(text: str) -> dict:
     """
     Parse transaction text using Groq's Llama model.
     
+    Messages matching the template of an earlier result are answered from
+    the template cache without an API call.
+    
     Args:
         text: Transaction text to parse
         
@@ -28,8 +182,16 @@ def parse_transaction_with_llm(text: str) -> dict:
     if not os.getenv("GROQ_API_KEY"):
         logger.warning("No GROQ_API_KEY, falling back to regex parsing")
         return parse_transaction_text_regex(text)
+    
+    text_lower = text.lower()
+    key = _template_key(text)
+    with _template_cache_lock:
+        template = _template_cache.get(key)
+    if template is not None:
+        return _from_template(template, text_lower)
         
     try:
+        from litellm import completion
         response = completion(
             model=MODEL,
             messages=[
@@ -41,23 +203,43 @@ def parse_transaction_with_llm(text: str) -> dict:
             response_format={"type": "json_object"}
         )
         
-        data = json.loads(response.choices[0].message.content)
-        
-        return {
-            "amount": float(data.get("amount", 0.0)),
-            "currency": data.get("currency", "INR"),
-            "merchant": data.get("merchant", "Unknown"),
-            "category": data.get("category", "Uncategorized"),
-            "transaction_type": data.get("transaction_type", "debit").lower(),
-            "account_name": data.get("account_name"),
-            "account_last4": data.get("account_last4"),
-            "date": data.get("date")
-        }
+        result = TxnLLM.model_validate(orjson.loads(response.choices[0].message.content)).model_dump()
+        _cache_template(key, result, text_lower)
+        return result
         
     except Exception as e:
         logger.error(f"LLM parsing failed: {e}")
         return parse_transaction_text_regex(text)
 
+
+def _extract_amount(text_lower: str) -> float:
+    amount_match = _AMOUNT_RE.search(text_lower)
+    return float(amount_match.group(1).replace(',', '')) if amount_match else 0.0
+
+
+def _extract_account(text_lower: str) -> tuple:
+    """(account_name, account_last4) from the account patterns."""
+    account_name = None
+    account_last4 = None
+    
+    for pattern in _ACCOUNT_RES:
+        match = pattern.search(text_lower)
+        if match:
+            if len(match.groups()) == 2:
+                account_name = match.group(1).strip().title()
+                account_last4 = match.group(2)
+            else:
+                account_last4 = match.group(1)
+            break
+            
+    if not account_last4:
+        last4_match = _LAST4_RE.search(text_lower)
+        if last4_match:
+            account_last4 = last4_match.group(1)
+    
+    return account_name, account_last4
+
+
 def parse_transaction_text_regex(text: str) -> dict:
     """
     Fallback: Parse transaction text using regex patterns.
@@ -65,60 +247,22 @@ def parse_transaction_text_regex(text: str) -> dict:
     text_lower = text.lower()
     
     # Extract amount
-    amount_match = re.search(r'rs\.?\s*(\d+[,\d]*)', text_lower)
-    amount = float(amount_match.group(1).replace(',', '')) if amount_match else 0.0
+    amount = _extract_amount(text_lower)
     
     # Extract merchant
     merchant = "Unknown"
-    merchant_patterns = [
-        r'at\s+([a-z\s]+?)(?:\s+on|\s+for|$)',
-        r'from\s+([a-z\s]+?)(?:\s+on|\s+for|$)',
-        r'to\s+([a-z\s]+?)(?:\s+on|\s+for|$)',
-    ]
-    for pattern in merchant_patterns:
-        match = re.search(pattern, text_lower)
+    for pattern in _MERCHANT_RES:
+        match = pattern.search(text_lower)
         if match:
             merchant = match.group(1).strip().title()
             break
             
-    # Transaction type
-    transaction_type = "debit" if any(word in text_lower for word in ['debited', 'debit', 'paid', 'payment']) else "credit"
-    
-    # Category
-    category = "Uncategorized"
-    if any(word in text_lower for word in ['shopping', 'amazon', 'flipkart']):
-        category = "Shopping"
-    elif any(word in text_lower for word in ['food', 'restaurant', 'zomato', 'swiggy']):
-        category = "Food"
-    elif any(word in text_lower for word in ['uber', 'ola', 'transport', 'taxi']):
-        category = "Transport"
-    elif any(word in text_lower for word in ['bill', 'electricity', 'water', 'gas']):
-        category = "Bills"
+    # Transaction type and category
+    is_debit, category = _classify_keywords(text_lower)
+    transaction_type = "debit" if is_debit else "credit"
         
     # Account details
-    account_name = None
-    account_last4 = None
-    
-    account_patterns = [
-        r'(?:card|a/c|account|ac)\s+(?:no\.?\s*)?(?:xx|ending\s+in\s+)?(\d{4})',
-        r'(\w+\s+(?:credit|debit)\s+card)\s+(?:xx)?(\d{4})',
-        r'(\w+\s+bank)\s+(?:a/c|account)\s+(?:xx)?(\d{4})',
-    ]
-    
-    for pattern in account_patterns:
-        match = re.search(pattern, text_lower)
-        if match:
-            if len(match.groups()) == 2:
-                account_name = match.group(1).strip().title()
-                account_last4 = match.group(2)
-            else:
-                account_last4 = match.group(1)
-            break
-            
-    if not account_last4:
-        last4_match = re.search(r'(?:xx|ending\s+in\s+|last\s+4\s+digits?\s+)(\d{4})', text_lower)
-        if last4_match:
-            account_last4 = last4_match.group(1)
+    account_name, account_last4 = _extract_account(text_lower)
             
     return {
         "amount": amount,
@@ -1,12 +1,27 @@
 """
 Test suite for agent base class and TaskPacket messaging system.
 """
+import asyncio
 import pytest
 from datetime import datetime
 from app.core.agent_base import BaseAgent, TaskPacket, AgentTool, AgentStatus
 from app.services.example_agents import SimpleAssistantAgent, AnalyzerAgent
 
 
+@pytest.fixture
+def analyzer():
+    """A fresh AnalyzerAgent, so no state carries over between tests."""
+    return AnalyzerAgent()
+
+
+@pytest.fixture
+def make_packet():
+    """Build TaskPackets with a default source agent ("t", or src=...)."""
+    def _mkpacket(**kwargs):
+        return TaskPacket(source_agent=kwargs.pop("src", "t"), **kwargs)
+    return _mkpacket
+
+
 class TestTaskPacket:
     """Test TaskPacket functionality."""
     
@@ -36,6 +51,15 @@ class TestTaskPacket:
         assert isinstance(json_str, str)
         assert "agent1" in json_str
         
+        # Encoded once, until a field is reassigned
+        assert packet.to_json() is json_str
+        packet.target_agent = "agent3"
+        assert "agent3" in packet.to_json()
+        packet.target_agent = "agent2"
+        
+        # Copies with updated fields are encoded afresh
+        assert '"data":5' in packet.model_copy(update={"data": 5}).to_json()
+        
         # Deserialize from JSON
         restored = TaskPacket.from_json(json_str)
         assert restored.source_agent == packet.source_agent
@@ -165,6 +189,26 @@ class TestBaseAgent:
         agent.clear_history()
         assert len(agent.get_conversation_history()) == 0
     
+    def test_entropy_gate(self, analyzer, make_packet):
+        """Test that gated agents skip empty and trivial packets."""
+        analyzer.entropy_gate = True
+        
+        for data in [None, "", [], {}, "hi", "meaningful message"]:
+            analyzer.handle_packet(make_packet(src="sender", data=data))
+        
+        history = analyzer.get_conversation_history()
+        assert [p.data for p in history] == ["meaningful message"]
+    
+    def test_dedupe(self, analyzer, make_packet):
+        """Test that deduping agents record a repeated payload once."""
+        analyzer.dedupe = True
+        
+        for data in [{"a": 1, "b": 2}, {"b": 2, "a": 1}, "other"]:
+            analyzer.handle_packet(make_packet(src="sender", data=data))
+        
+        history = analyzer.get_conversation_history()
+        assert [p.data for p in history] == [{"a": 1, "b": 2}, "other"]
+    
     def test_agent_tools(self):
         """Test agent tool discovery."""
         agent = AnalyzerAgent()
@@ -219,6 +263,32 @@ class TestAgentCommunication:
         
         assert response2.source_agent == "analyzer"
         assert len(analyzer.get_conversation_history()) == 2
+    
+    def test_handle_packet_batch(self, analyzer, make_packet):
+        """Test handling a batch of packets off the event loop."""
+        packets = [make_packet(src=f"agent_{i}", data=f"message {i}") for i in range(3)]
+        
+        responses = asyncio.run(analyzer.handle_packet_batch(packets))
+        
+        assert [r.target_agent for r in responses] == ["agent_0", "agent_1", "agent_2"]
+        assert len(analyzer.get_conversation_history()) == 3
+    
+    def test_handle_packet_batch_isolates_failures(self, make_packet):
+        """Test that a failing input in a batch only fails its own packet."""
+        class Picky(AnalyzerAgent):
+            def process(self, input_data):
+                if input_data == "bad":
+                    raise ValueError("bad input")
+                return super().process(input_data)
+        
+        agent = Picky()
+        packets = [make_packet(src="a", data="good"), make_packet(src="b", data="bad")]
+        
+        responses = asyncio.run(agent.handle_packet_batch(packets))
+        
+        assert responses[0].data["input_type"] == "str"
+        assert responses[1].metadata["error"] is True
+        assert responses[1].target_agent == "b"
 
 
 class TestErrorHandling:
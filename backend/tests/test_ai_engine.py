@@ -0,0 +1,86 @@
+"""
+Test suite for AIEngine execution logging.
+"""
+import asyncio
+import time
+import uuid
+import pytest
+from datetime import datetime, timezone
+from app.services import ai_engine as ai_engine_module
+from app.services.ai_engine import AIEngine
+
+
+@pytest.fixture
+def written(monkeypatch):
+    """Collect the AgentLog rows the engine would write to the database."""
+    rows = []
+    monkeypatch.setattr(ai_engine_module, "_write_logs", rows.extend)
+    return rows
+
+
+async def _log(engine, db_session, run_id, parent_log_id=None):
+    await engine._log_execution(
+        db_session=db_session,
+        run_id=run_id,
+        agent_name="finance",
+        model_used="test-model",
+        input_summary="input",
+        start_time=datetime.now(timezone.utc),
+        start_ns=time.perf_counter_ns(),
+        status="success",
+        parent_log_id=parent_log_id
+    )
+
+
+class TestExecutionLogging:
+    """Test that execution logs keep their handoff chain."""
+
+    def test_parent_log_id_is_parent_run_id(self, written):
+        """Test that a child log points at its parent's run_id."""
+        engine = AIEngine()
+        parent_run, child_run = str(uuid.uuid4()), str(uuid.uuid4())
+
+        async def run():
+            engine.start_log_flusher()
+            await _log(engine, object(), parent_run)
+            await _log(engine, object(), child_run, parent_log_id=parent_run)
+            await engine.stop_log_flusher()
+
+        asyncio.run(run())
+
+        assert [log.run_id for log in written] == [parent_run, child_run]
+        assert written[0].parent_log_id is None
+        assert written[1].parent_log_id == parent_run
+
+    def test_written_without_flusher(self, written):
+        """Test that logs are still written when the flusher is not running."""
+        engine = AIEngine()
+
+        asyncio.run(_log(engine, object(), "run-1"))
+
+        assert [log.run_id for log in written] == ["run-1"]
+
+    def test_no_session_no_log(self, written):
+        """Test that calls without a db_session are not logged."""
+        engine = AIEngine()
+
+        asyncio.run(_log(engine, None, "run-1"))
+
+        assert written == []
+
+
+class TestRAGContextCache:
+    """Test that cached RAG context gives way to new corrections."""
+
+    def test_invalidate_drops_only_that_user(self):
+        """Test that invalidating one user keeps other users' contexts."""
+        engine = AIEngine()
+        mine = ai_engine_module._rag_cache_key("an email", 1)
+        theirs = ai_engine_module._rag_cache_key("an email", 2)
+        ai_engine_module._rag_context_cache[mine] = "old context"
+        ai_engine_module._rag_context_cache[theirs] = "other context"
+
+        engine.invalidate_rag_context(1)
+
+        assert mine not in ai_engine_module._rag_context_cache
+        assert ai_engine_module._rag_context_cache.pop(theirs) == "other context"
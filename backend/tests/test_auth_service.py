@@ -0,0 +1,56 @@
+"""
+Test suite for the HS256 token fast path in the auth service.
+"""
+import time
+import jwt
+import pytest
+from app.services.auth_service import _sign_hs256, JWT_SECRET_KEY_BYTES
+
+
+def _decode(token):
+    return jwt.decode(token, JWT_SECRET_KEY_BYTES, algorithms=["HS256"])
+
+
+class TestSignHS256:
+    """Test that tokens from _sign_hs256 verify with PyJWT."""
+
+    def test_round_trip(self):
+        """Test that PyJWT decodes the claims we signed."""
+        claims = {"sub": "42", "username": "alice", "exp": int(time.time()) + 60}
+
+        assert _decode(_sign_hs256(claims)) == claims
+
+    def test_matches_pyjwt_signature(self):
+        """Test that the signature is the one PyJWT computes for the same input."""
+        token = _sign_hs256({"sub": "1", "exp": int(time.time()) + 60})
+        header, payload, signature = token.split(".")
+
+        algorithm = jwt.get_algorithm_by_name("HS256")
+        expected = algorithm.sign(f"{header}.{payload}".encode(),
+                                  algorithm.prepare_key(JWT_SECRET_KEY_BYTES))
+
+        assert jwt.utils.base64url_decode(signature) == expected
+
+    def test_expired_token_rejected(self):
+        """Test that an expired token fails verification."""
+        token = _sign_hs256({"sub": "42", "exp": int(time.time()) - 10})
+
+        with pytest.raises(jwt.ExpiredSignatureError):
+            _decode(token)
+
+    def test_tampered_token_rejected(self):
+        """Test that changing the payload invalidates the signature."""
+        token = _sign_hs256({"sub": "42", "exp": int(time.time()) + 60})
+        forged = _sign_hs256({"sub": "1", "exp": int(time.time()) + 60})
+        header, _, signature = token.split(".")
+        tampered = ".".join([header, forged.split(".")[1], signature])
+
+        with pytest.raises(jwt.InvalidSignatureError):
+            _decode(tampered)
+
+    def test_wrong_key_rejected(self):
+        """Test that a token does not verify under another secret."""
+        token = _sign_hs256({"sub": "42", "exp": int(time.time()) + 60})
+
+        with pytest.raises(jwt.InvalidSignatureError):
+            jwt.decode(token, b"another-secret-key-of-sufficient-length!", algorithms=["HS256"])